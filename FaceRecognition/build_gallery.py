@@ -0,0 +1,48 @@
+"""Builds and compares versioned face galleries offline.
+
+Usage:
+    python build_gallery.py build --model cnn --workers 4
+    python build_gallery.py compare known_faces/gallery_hog_j1_small.pkl known_faces/gallery_cnn_j1_small.pkl
+"""
+import sys
+import os
+import argparse
+
+# ensure our src folder is on the path
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+from core.gallery import build_gallery, compare_galleries
+
+
+def main(argv=None):
+    default_photos = "/home/cdadmin/remote_documents"
+    default_out = "/home/cdadmin/Desktop/FaceRecognition/known_faces"
+
+    parser = argparse.ArgumentParser(description="Build and compare face galleries.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="re-encode a photo folder into a versioned gallery")
+    build.add_argument("--photos", default=default_photos)
+    build.add_argument("--out", default=default_out)
+    build.add_argument("--model", choices=("hog", "cnn"), default="hog")
+    build.add_argument("--jitters", type=int, default=1)
+    build.add_argument("--landmarks", choices=("small", "large"), default="small")
+    build.add_argument("--workers", type=int, default=None)
+    build.add_argument("--checkpoint-every", type=int, default=50)
+
+    compare = sub.add_parser("compare", help="report throughput and accuracy of galleries")
+    compare.add_argument("galleries", nargs="+")
+    compare.add_argument("--tolerance", type=float, default=0.5)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build_gallery(
+            args.photos, args.out, args.model, args.jitters, args.landmarks,
+            workers=args.workers, checkpoint_every=args.checkpoint_every
+        )
+    else:
+        compare_galleries(args.galleries, args.tolerance)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""Pre-renders the spoken announcements of every enrolled person into the TTS cache.
+
+Names are read from the saved gallery or pickles; nothing is re-encoded.
+
+Usage:
+    python prerender_announcements.py
+"""
+import sys
+import os
+from dotenv import load_dotenv
+
+# ensure our src folder is on the path
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+# the TTS backend and cache folder may be configured in the kiosk's .env
+env_path = "/home/cdadmin/Desktop/FR2/.env"
+if os.path.exists(env_path):
+    load_dotenv(env_path)
+
+from core import fr
+from utils.utils import prerender_announcements, TTS_CACHE_DIR
+
+
+if __name__ == '__main__':
+    fr.load_known_faces(rebuild=False)
+    if not fr.known_face_names:
+        print("⚠️ No known faces saved yet, only the generic announcements will be rendered.")
+    count = prerender_announcements(set(fr.known_face_names))
+    print(f"✅ Pre-rendered {count} announcements into {TTS_CACHE_DIR}")
@@ -3,6 +3,12 @@ import os
 import logging
 from dotenv import load_dotenv
 
+# ensure our src folder is on the path
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+# start the clock before anything heavy is imported
+from utils.startup import startup_timer
+
 # configure logging: INFO+ by default; suppress DEBUG noise
 logging.basicConfig(
     level=logging.INFO,
@@ -31,25 +37,28 @@ if missing:
     logger.error("Missing required env vars: %s", ", ".join(missing))
     sys.exit(1)
 
-# ensure our src folder is on the path
-sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
-
-from core import capture_frames
+from core import capture_frames, fr
 from utils import speak_message
 from gui import FaceRecognitionUI
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import QTimer, Qt
 
 if __name__ == '__main__':
+    startup_timer.mark("modules imported")
+
+    # load dlib models and known faces while the UI comes up
+    fr.warm_up(background=True)
+
     app = QApplication(sys.argv)
     window = FaceRecognitionUI()
     # remove window decorations and make truly fullscreen
     window.setWindowFlags(Qt.FramelessWindowHint)
     window.showFullScreen()
     window.showFullScreen()
+    startup_timer.mark("window shown")
 
-    # give the UI a moment to initialize, then start frame capture
-    QTimer.singleShot(2000, window.start_camera_capture)
+    # start frame capture as soon as the event loop is running
+    QTimer.singleShot(0, window.start_camera_capture)
 
     sys.exit(app.exec_())
 
@@ -0,0 +1,39 @@
+import sys
+import os
+import time
+import logging
+from dotenv import load_dotenv
+
+# configure logging: INFO+ by default; suppress DEBUG noise
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%H:%M:%S"
+)
+
+# load environment variables from explicit path
+env_path = "/home/cdadmin/Desktop/FR2/.env"
+if not os.path.exists(env_path):
+    logging.error(".env file not found at %s", env_path)
+    sys.exit(1)
+load_dotenv(env_path)
+logger = logging.getLogger(__name__)
+
+# ensure our src folder is on the path
+sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+
+from core.multi_camera import MultiCameraManager, camera_pairs_from_env
+
+if __name__ == '__main__':
+    # headless: one process serving every camera pair listed in CAMERA_PAIRS
+    pairs = camera_pairs_from_env()
+    workers = int(os.getenv("RECOGNITION_WORKERS", "0")) or None
+    manager = MultiCameraManager(pairs, workers=workers)
+    manager.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Stopping camera pairs…")
+    finally:
+        manager.stop()
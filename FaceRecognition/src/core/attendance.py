@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+# Events returned by PunchGate.process()
+UNKNOWN = "unknown"
+FAKE_FACE_LOCKOUT = "fake_face_lockout"
+PUNCH = "punch"
+
+
+def user_id_from_name(name):
+    """Extracts the employee ID from a display name like ``"12 - John Smith"``."""
+    try:
+        return int(name.split(" - ")[0])
+    except (ValueError, AttributeError):
+        return None
+
+
+def next_punch_type(last_punch_type):
+    return 'OUT' if last_punch_type == 'IN' else 'IN'
+
+
+def save_punch_photo(frame, name, user_id, folder):
+    """Writes the punch snapshot to `folder` and returns its public /uploads URL.
+
+    Raises RuntimeError if the photo could not be written, so no punch points
+    at a missing file.
+    """
+    import cv2
+
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+    fn = name.replace(' ', '_')
+    path = os.path.join(folder, f"{fn}_{user_id}_{ts}.jpg")
+    if not cv2.imwrite(path, frame):
+        raise RuntimeError(f"Unable to save punch photo {path}")
+    return f"/uploads/{os.path.basename(path)}"
+
+
+class PunchGate:
+    """Turns recognized names into punch decisions.
+
+    Applies the kiosk rules independently of the UI: unknown-user throttling,
+    blink liveness with a fake-face lockout, and duplicate punch suppression.
+    """
+
+    def __init__(self, unknown_throttle=5, fake_face_limit=10, fake_face_lockout=30,
+                 duplicate_window=30):
+        self.unknown_throttle = timedelta(seconds=unknown_throttle)
+        self.fake_face_limit = fake_face_limit
+        self.fake_face_lockout = timedelta(seconds=fake_face_lockout)
+        self.duplicate_window = duplicate_window
+
+        self.last_punches = {}
+        self.fake_face_counter = 0
+        self.fake_face_timeout = None
+        self.unknown_timeout = None
+
+    def process(self, names, frame, now, detect_blink):
+        """Returns a list of ``(event, name, user_id)`` tuples for one frame."""
+        events = []
+        for name in names:
+            if name == "Unknown":
+                # throttle notifications
+                if self.unknown_timeout and now < self.unknown_timeout:
+                    continue
+                self.unknown_timeout = now + self.unknown_throttle
+                events.append((UNKNOWN, name, None))
+                continue
+            if name == "Fake Face":
+                continue
+
+            # fake-face lockout
+            if self.fake_face_timeout and now < self.fake_face_timeout:
+                continue
+
+            uid = user_id_from_name(name)
+            if uid is None:
+                continue
+
+            # liveness blink detection
+            if not detect_blink(frame):
+                self.fake_face_counter += 1
+                if self.fake_face_counter >= self.fake_face_limit:
+                    self.fake_face_timeout = now + self.fake_face_lockout
+                    self.fake_face_counter = 0
+                    events.append((FAKE_FACE_LOCKOUT, name, uid))
+                continue
+
+            self.fake_face_counter = 0
+
+            # duplicate punch suppression
+            last = self.last_punches.get(uid)
+            if last and (now - last).total_seconds() < self.duplicate_window:
+                continue
+
+            self.last_punches[uid] = now
+            events.append((PUNCH, name, uid))
+        return events
+
+
+class MySQLAttendanceStore:
+    """Reads and writes punches in the log_Information table of the HR database."""
+
+    def __init__(self, device_id=1):
+        self.device_id = device_id
+
+    def _connect(self):
+        from mysql.connector import connect
+        return connect(
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            host=os.getenv('DB_HOST'),
+            database=os.getenv('DB_NAME')
+        )
+
+    def get_punch_type(self, user_id):
+        """Returns the punch type the user's next punch should have."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT punch_type FROM log_Information WHERE user_id=%s ORDER BY date_time_event DESC LIMIT 1",
+            (user_id,)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        return next_punch_type(row[0] if row else None)
+
+    def record_punch(self, user_id, punch_type, photo_url, now):
+        longitude = float(os.getenv('LONGITUDE', '14.47631000'))
+        latitude  = float(os.getenv('LATITUDE',  '35.92584060'))
+
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO log_Information "
+            "(date_time_saved, date_time_event, device_id, user_id, punch_type, photo_url, "
+            "longitude, latitude, punch_date, punch_time) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            (
+                now, now, self.device_id, user_id, punch_type,
+                photo_url, longitude, latitude,
+                now.date(), now.time()
+            )
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+
+class SQLiteAttendanceStore:
+    """Local stand-in for the HR database, used by replays and load tests."""
+
+    def __init__(self, path=":memory:", device_id=1):
+        self.device_id = device_id
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS log_Information ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, date_time_saved TEXT, date_time_event TEXT, "
+            "device_id INTEGER, user_id INTEGER, punch_type TEXT, photo_url TEXT, "
+            "longitude REAL, latitude REAL, punch_date TEXT, punch_time TEXT)"
+        )
+        self._conn.commit()
+
+    def get_punch_type(self, user_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT punch_type FROM log_Information WHERE user_id=? ORDER BY date_time_event DESC, id DESC LIMIT 1",
+                (user_id,)
+            ).fetchone()
+        return next_punch_type(row[0] if row else None)
+
+    def record_punch(self, user_id, punch_type, photo_url, now):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO log_Information "
+                "(date_time_saved, date_time_event, device_id, user_id, punch_type, photo_url, "
+                "longitude, latitude, punch_date, punch_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    now.isoformat(), now.isoformat(), self.device_id, user_id, punch_type,
+                    photo_url, 0.0, 0.0, now.date().isoformat(), now.time().isoformat()
+                )
+            )
+            self._conn.commit()
+
+    def punches(self):
+        """Returns ``(user_id, punch_type, date_time_event)`` rows in insertion order."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id, punch_type, date_time_event FROM log_Information ORDER BY id"
+            ).fetchall()
@@ -1,4 +1,6 @@
+import os
 import cv2
+import random
 import threading
 import time
 import numpy as np
@@ -6,92 +8,303 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+
+def nvr_rtsp_url(channel):
+    """RTSP URL of an NVR channel, using the CAMERA_* environment variables."""
+    user, pwd, ip, port = (
+        os.getenv('CAMERA_USER'),
+        os.getenv('CAMERA_PASSWORD'),
+        os.getenv('CAMERA_IP'),
+        os.getenv('CAMERA_PORT')
+    )
+    return f"rtsp://{user}:{pwd}@{ip}:{port}/cam/realmonitor?channel={channel}&subtype=0"
+
+
+def letterbox(frame, target_width, target_height):
+    """Scales a frame to fit the target size, padding the rest with black."""
+    if frame is None:
+        return None
+    h, w = frame.shape[:2]
+    scale = min(target_width / w, target_height / h)
+    new_w, new_h = int(w * scale), int(h * scale)
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    top = (target_height - new_h) // 2
+    left = (target_width - new_w) // 2
+    canvas = np.zeros((target_height, target_width, 3), dtype=np.uint8)
+    canvas[top:top+new_h, left:left+new_w] = resized
+    return canvas
+
+
+# Stream health states
+CONNECTING = "connecting"
+LIVE = "live"
+STALLED = "stalled"
+RECONNECTING = "reconnecting"
+OFFLINE = "offline"
+
+
+def open_rtsp_capture(url, timeout, read_timeout=None):
+    """Opens an RTSP stream with FFmpeg open/read timeouts where OpenCV supports them."""
+    params = []
+    if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+        params = [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(timeout * 1000),
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, int((read_timeout or timeout) * 1000),
+        ]
+    cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG, params) if params else cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+    if cap.isOpened():
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+class StreamWorker:
+    """Reads one stream, reconnecting with jittered exponential backoff.
+
+    The reader thread only records progress; stalls are detected from the
+    outside by `CameraStreamManager`'s watchdog, which abandons a reader that
+    is stuck inside `read()` and starts a fresh one after a backoff. An
+    abandoned reader notices its generation is stale and exits when its call
+    returns. The failure count, which drives the backoff, is only reset once
+    the stream has stayed live for `stable_after` seconds, so a stream that
+    keeps stalling right after connecting still backs off and goes offline.
+    """
+
+    def __init__(self, cam_type, url, key, frames, resize, capture_factory,
+                 base_delay=1.0, max_delay=60.0, offline_after=5, stable_after=30.0):
+        self.cam_type = cam_type
+        self.url = url
+        self.key = key
+        self.frames = frames
+        self.resize = resize
+        self.capture_factory = capture_factory
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.offline_after = offline_after
+        self.stable_after = stable_after
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.generation = 0
+        self.state = CONNECTING
+        self.state_since = time.monotonic()
+        self.last_progress = self.state_since
+        self.last_frame_time = None
+        self.retry_at = None
+        self.failures = 0
+        self.down_since = None  # set when a live stream goes down, for recovery time
+        self.metrics = {
+            "frames": 0,
+            "reconnects": 0,
+            "stalls": 0,
+            "failed_opens": 0,
+            "last_recovery_seconds": None,
+        }
+
+    def start(self, backoff=False):
+        """Starts a new reader; with `backoff` it waits out the retry delay first."""
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        threading.Thread(
+            target=self._run, args=(generation, backoff),
+            name=f"camera-{self.cam_type}-{generation}", daemon=True
+        ).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _set_state(self, state, generation):
+        """Changes state if the caller's reader is still current; returns False otherwise."""
+        with self.lock:
+            if generation != self.generation:
+                return False
+            now = time.monotonic()
+            if state != self.state:
+                logger.info("%s camera: %s -> %s", self.cam_type.capitalize(), self.state, state)
+                if state == LIVE and self.down_since is not None:
+                    self.metrics["last_recovery_seconds"] = now - self.down_since
+                    self.down_since = None
+                elif self.state == LIVE:
+                    self.down_since = now
+                self.state = state
+                self.state_since = now
+            self.last_progress = now
+            return True
+
+    def _backoff(self, generation):
+        """Sleeps for the next jittered exponential delay; returns False if stopped or superseded."""
+        delay = min(self.max_delay, self.base_delay * 2 ** self.failures)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        state = OFFLINE if self.failures >= self.offline_after else RECONNECTING
+        if not self._set_state(state, generation):
+            return False
+        self.retry_at = time.monotonic() + delay
+        logger.warning("%s feed down. Reconnecting in %.1f s…", self.cam_type.capitalize(), delay)
+        self.stop_event.wait(delay)
+        self.retry_at = None
+        return not self.stop_event.is_set()
+
+    def _blank(self):
+        self.frames[self.key] = np.zeros_like(self.frames[self.key])
+
+    def _run(self, generation, backoff=False):
+        cap = None
+        try:
+            if backoff and not self._backoff(generation):
+                return
+            while not self.stop_event.is_set():
+                if not self._set_state(CONNECTING, generation):
+                    return
+                cap = self.capture_factory(self.url)
+                if generation != self.generation:
+                    return
+                if cap is None or not cap.isOpened():
+                    self.metrics["failed_opens"] += 1
+                    self.failures += 1
+                    if cap is not None:
+                        cap.release()
+                        cap = None
+                    if not self._backoff(generation):
+                        return
+                    continue
+
+                logger.info("%s camera connected.", self.cam_type.capitalize())
+                while not self.stop_event.is_set():
+                    ret, frame = cap.read()
+                    if generation != self.generation:
+                        return  # abandoned by the watchdog while blocked in read()
+                    if not ret or frame is None:
+                        break
+                    resized = self.resize(frame)
+                    if resized is None:
+                        continue
+                    self.frames[self.key] = resized
+                    self.last_frame_time = time.monotonic()
+                    self.metrics["frames"] += 1
+                    if not self._set_state(LIVE, generation):
+                        return
+                    if self.failures and time.monotonic() - self.state_since >= self.stable_after:
+                        self.failures = 0
+
+                cap.release()
+                cap = None
+                self._blank()
+                self.failures += 1
+                self.metrics["reconnects"] += 1
+                if not self._backoff(generation):
+                    return
+        finally:
+            if cap is not None:
+                cap.release()
+
+    def check(self, stall_timeout, connect_timeout):
+        """Watchdog hook: restarts a reader that stopped making progress.
+
+        A live stream is stalled after `stall_timeout` without frames; an
+        open attempt gets `connect_timeout` before it is considered hung.
+        """
+        with self.lock:
+            if self.state == LIVE:
+                limit = stall_timeout
+            elif self.state == CONNECTING:
+                limit = connect_timeout
+            else:
+                return
+            if time.monotonic() - self.last_progress < limit:
+                return
+            logger.warning(
+                "%s camera stalled for %.0f s while %s; restarting reader.",
+                self.cam_type.capitalize(), time.monotonic() - self.last_progress, self.state
+            )
+            self.metrics["stalls"] += 1
+            self.failures += 1
+            if self.state == LIVE:
+                self.down_since = time.monotonic()
+            self.state = STALLED
+            self.state_since = time.monotonic()
+        self._blank()
+        self.start(backoff=True)
+
+    def health(self):
+        now = time.monotonic()
+        with self.lock:
+            return {
+                "state": self.state,
+                "state_seconds": now - self.state_since,
+                "last_frame_age": now - self.last_frame_time if self.last_frame_time else None,
+                "retry_in": max(0.0, self.retry_at - now) if self.retry_at else None,
+                "failures": self.failures,
+                **self.metrics,
+            }
+
+
 class CameraStreamManager:
+    """Keeps the latest visual and thermal frames in a shared dict.
+
+    Each stream has its own reader thread; a single watchdog thread detects
+    stalls by frame timestamp and restarts stuck readers. `health()` exposes
+    each stream's state and counters to the UI and metrics.
+    """
+
     def __init__(self, visual_url, thermal_url,
                  target_height=480, target_width=640,
-                 retry_delay=5, timeout=10, shared_dict=None):
+                 retry_delay=1, timeout=10, shared_dict=None,
+                 stall_timeout=5, max_retry_delay=60, capture_factory=None):
         self.visual_url = visual_url
         self.thermal_url = thermal_url
         self.target_height = target_height
         self.target_width = target_width
         self.retry_delay = retry_delay
         self.timeout = timeout
+        self.stall_timeout = stall_timeout
 
         self.frames = shared_dict if shared_dict is not None else {
             'frame': np.zeros((target_height, target_width, 3), dtype=np.uint8),
             'thermal_frame': np.zeros((target_height, target_width, 3), dtype=np.uint8)
         }
 
-        self.visual_cap = self.try_open_camera(self.visual_url, "visual")
-        self.thermal_cap = self.try_open_camera(self.thermal_url, "thermal")
+        # reads time out no later than the watchdog abandons them, so a stalled
+        # session is closed before its replacement connects
+        read_timeout = min(self.timeout, self.stall_timeout)
+        factory = capture_factory or (lambda url: open_rtsp_capture(url, self.timeout, read_timeout))
+        self.streams = {
+            cam_type: StreamWorker(
+                cam_type, url, key, self.frames, self.resize_frame, factory,
+                base_delay=retry_delay, max_delay=max_retry_delay
+            )
+            for cam_type, url, key in (
+                ("visual", visual_url, 'frame'),
+                ("thermal", thermal_url, 'thermal_frame'),
+            )
+        }
+        self._stop = threading.Event()
+        for stream in self.streams.values():
+            stream.start()
+        threading.Thread(target=self._watchdog, name="camera-watchdog", daemon=True).start()
 
-        if self.visual_cap:
-            threading.Thread(target=self.loop_cam, args=("visual",), daemon=True).start()
-        if self.thermal_cap:
-            threading.Thread(target=self.loop_cam, args=("thermal",), daemon=True).start()
+    def resize_frame(self, frame):
+        return letterbox(frame, self.target_width, self.target_height)
 
-    def try_open_camera(self, rtsp_url, cam_type):
-        logger.info("Attempting to connect to %s camera…", cam_type)
-        cap = None
-        start = time.time()
-        while time.time() - start < self.timeout:
-            cap = cv2.VideoCapture(rtsp_url, cv2.CAP_FFMPEG)
-            if cap.isOpened():
-                logger.info("%s camera connected.", cam_type.capitalize())
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                return cap
-            cap.release()
-            time.sleep(1)
-        logger.warning(
-            "%s camera unavailable after %s seconds. Using black frames.",
-            cam_type.capitalize(), self.timeout
-        )
-        return None
+    def _watchdog(self):
+        interval = max(0.2, self.stall_timeout / 4)
+        while not self._stop.wait(interval):
+            for stream in self.streams.values():
+                stream.check(self.stall_timeout, self.timeout + self.stall_timeout)
 
-    def resize_frame(self, frame):
-        if frame is None:
-            return None
-        h, w = frame.shape[:2]
-        scale = min(self.target_width / w, self.target_height / h)
-        new_w, new_h = int(w * scale), int(h * scale)
-        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
-        top = (self.target_height - new_h) // 2
-        left = (self.target_width - new_w) // 2
-        canvas = np.zeros((self.target_height, self.target_width, 3), dtype=np.uint8)
-        canvas[top:top+new_h, left:left+new_w] = resized
-        return canvas
-
-    def loop_cam(self, cam_type):
-        cap = self.visual_cap if cam_type == "visual" else self.thermal_cap
-        key = 'frame' if cam_type == "visual" else 'thermal_frame'
-        url = self.visual_url if cam_type == "visual" else self.thermal_url
-
-        while True:
-            if cap is None or not cap.isOpened():
-                logger.warning(
-                    "%s feed lost. Reconnecting in %s s…",
-                    cam_type.capitalize(), self.retry_delay
-                )
-                time.sleep(self.retry_delay)
-                cap = self.try_open_camera(url, cam_type)
-
-            ret, frame = cap.read() if cap else (False, None)
-            logger.debug(
-                "[%s] ret=%s, frame=%s",
-                cam_type, ret, 'Yes' if frame is not None else 'None'
-            )
+    def health(self):
+        """Returns ``{"visual": {...}, "thermal": {...}}`` with state and counters."""
+        return {cam_type: stream.health() for cam_type, stream in self.streams.items()}
 
-            if ret and frame is not None:
-                resized = self.resize_frame(frame)
-                if resized is not None:
-                    self.frames[key] = resized
-                    logger.debug("[%s] Frame updated in shared dict", cam_type)
+    def stop(self):
+        self._stop.set()
+        for stream in self.streams.values():
+            stream.stop()
 
 
 def capture_frames(
     visual_rtsp_url, thermal_rtsp_url,
     target_height=480, target_width=640,
-    retry_delay=5, timeout=10, shared_dict=None
+    retry_delay=1, timeout=10, shared_dict=None
 ):
     """
     Entry point for face_ui.py
@@ -0,0 +1,125 @@
+"""Local fake camera streams for exercising reconnection and the watchdog.
+
+`FakeCameraFactory` is passed as ``capture_factory`` to CameraStreamManager
+and hands out `FakeCapture` objects that can be told to stall, drop or refuse
+connections on demand, without an NVR.
+
+Demo (from the ``src`` folder):
+    python -m core.fake_stream
+"""
+import time
+import logging
+import threading
+
+import numpy as np
+
+
+class FakeCapture:
+    """Mimics the parts of cv2.VideoCapture the stream workers use."""
+
+    def __init__(self, fps=10.0, height=480, width=640, opened=True):
+        self.interval = 1.0 / fps
+        self.height = height
+        self.width = width
+        self.opened = opened
+        self.frame_count = 0
+        self._running = threading.Event()
+        self._running.set()
+        self._drop = False
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        return True
+
+    def read(self):
+        # blocks while stalled, like an FFmpeg read on a hung RTSP session
+        self._running.wait()
+        time.sleep(self.interval)
+        if self._drop or not self.opened:
+            return False, None
+        self.frame_count += 1
+        frame = np.full((self.height, self.width, 3), self.frame_count % 255 + 1, dtype=np.uint8)
+        return True, frame
+
+    def release(self):
+        self.opened = False
+        self._running.set()
+
+    def stall(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def drop(self):
+        """Makes the next read fail, as if the connection was closed."""
+        self._drop = True
+
+
+class FakeCameraFactory:
+    """Capture factory creating one FakeCapture per connection attempt."""
+
+    def __init__(self, fps=10.0):
+        self.fps = fps
+        self.captures = {}
+        self.refuse = set()
+        self.opens = 0
+
+    def __call__(self, url):
+        self.opens += 1
+        cap = FakeCapture(self.fps, opened=url not in self.refuse)
+        self.captures[url] = cap
+        return cap
+
+    def stall(self, url):
+        self.captures[url].stall()
+
+    def drop(self, url):
+        self.captures[url].drop()
+
+    def go_offline(self, url):
+        """Refuses new connections and drops the current one."""
+        self.refuse.add(url)
+        self.drop(url)
+
+    def come_back(self, url):
+        self.refuse.discard(url)
+
+
+def _demo():
+    from core.camera import CameraStreamManager
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s", datefmt="%H:%M:%S")
+    factory = FakeCameraFactory()
+    manager = CameraStreamManager(
+        "fake://visual", "fake://thermal",
+        stall_timeout=2, retry_delay=0.5, max_retry_delay=4, timeout=2,
+        capture_factory=factory
+    )
+
+    def show(step):
+        visual = manager.health()["visual"]
+        print(f"{step:<28} state={visual['state']:<12} stalls={visual['stalls']} "
+              f"reconnects={visual['reconnects']} recovery={visual['last_recovery_seconds']}")
+
+    time.sleep(1)
+    show("running")
+    factory.stall("fake://visual")
+    time.sleep(3)
+    show("after stall")
+    time.sleep(2)
+    show("recovered from stall")
+    factory.go_offline("fake://visual")
+    time.sleep(6)
+    show("during outage")
+    factory.come_back("fake://visual")
+    time.sleep(6)
+    show("after outage")
+    print(f"connection attempts: {factory.opens}")
+    manager.stop()
+
+
+if __name__ == '__main__':
+    _demo()
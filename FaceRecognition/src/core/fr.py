@@ -1,24 +1,40 @@
 import os
 import cv2
-import face_recognition
 import pickle
-import dlib
+import logging
 import numpy as np
 import re
+import time
+import threading
+from collections import OrderedDict
+from core.gallery import parse_display_name, save_gallery, load_gallery
+from core.quality import enroll_photo, filter_enrollment, build_prototypes
 
 # ✅ Directories for storing face data
 test_faces_folder = "/home/cdadmin/remote_documents"
 known_faces_folder = "/home/cdadmin/Desktop/FaceRecognition/known_faces"
 
-# ✅ Load Dlib’s shape predictor model
+# ✅ Encoder configuration; a gallery built with the same settings is loaded at runtime
+DETECTION_MODEL = os.getenv("FR_DETECTION_MODEL", "hog")
+NUM_JITTERS = int(os.getenv("FR_NUM_JITTERS", "1"))
+LANDMARK_MODEL_SIZE = os.getenv("FR_LANDMARK_MODEL", "small")
+
+# ✅ Dlib’s shape predictor model (loaded lazily, it is ~100 MB)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LANDMARK_MODEL = os.path.join(BASE_DIR, "shape_predictor_68_face_landmarks.dat")
 
-if not os.path.exists(LANDMARK_MODEL):
-    raise RuntimeError(f"❌ ERROR: Missing landmark model file: {LANDMARK_MODEL}")
+logger = logging.getLogger(__name__)
+
+# ✅ Heavy modules and models, populated on first use by _load_models()
+_models_lock = threading.Lock()
+_face_recognition = None
+_detector = None
+_predictor = None
 
-detector = dlib.get_frontal_face_detector()
-predictor = dlib.shape_predictor(LANDMARK_MODEL)
+# ✅ Set once models and known faces are loaded; warm_up_error holds the last failure
+models_ready = threading.Event()
+warm_up_error = None
+_warm_up_thread = None
 
 # ✅ Lists to store known encodings & names
 known_face_encodings = []
@@ -29,6 +45,225 @@ last_frame = None
 motion_threshold = 5000  # Minimum pixel difference for detecting movement
 
 
+class EncodingCache:
+    """LRU/TTL cache of face encodings keyed by a perceptual hash of the face crop.
+
+    A stationary face produces an almost identical crop on every tick, so the
+    expensive dlib encoding (and the gallery match) can be reused until the crop
+    or its box changes noticeably. Only faces tracked across consecutive frames
+    can hit: every entry not matched in a frame is dropped by ``end_frame()``,
+    so a face leaving the spot invalidates its entry before someone else can
+    step in. Entries are re-encoded after ``ttl`` seconds and the cache is
+    bounded by ``max_bytes`` of stored encodings.
+    """
+
+    HASH_SIZE = 8
+
+    def __init__(self, max_bytes=256 * 1024, ttl=2.0, max_hamming=3, max_shift=0.15):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_hamming = max_hamming  # bits that may differ between hashes
+        self.max_shift = max_shift      # allowed box movement, as a fraction of box size
+        self._entries = OrderedDict()
+        self._seen = set()              # entries matched or stored in the current frame
+        self._next_key = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def crop_hash(cls, gray, location):
+        """Difference hash (dHash) of the face crop as a 64-bit integer."""
+        top, right, bottom, left = location
+        h, w = gray.shape[:2]
+        crop = gray[max(0, top):min(h, bottom), max(0, left):min(w, right)]
+        if crop.size == 0:
+            return None
+        small = cv2.resize(crop, (cls.HASH_SIZE + 1, cls.HASH_SIZE), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int(np.packbits(bits).view('>u8')[0])
+
+    def _box_matches(self, a, b):
+        top_a, right_a, bottom_a, left_a = a
+        top_b, right_b, bottom_b, left_b = b
+        size = max(bottom_a - top_a, right_a - left_a, 1)
+        return max(abs(top_a - top_b), abs(right_a - right_b),
+                   abs(bottom_a - bottom_b), abs(left_a - left_b)) <= self.max_shift * size
+
+    def get(self, crop_hash, location, now=None):
+        """Returns the cached ``(encoding, name)`` for a matching crop, or None.
+
+        A hit moves the entry to the face's current hash and box, so it keeps
+        following the same face from frame to frame.
+        """
+        if crop_hash is None:
+            return None
+        now = time.monotonic() if now is None else now
+        location = tuple(location)
+        with self._lock:
+            for key, (created, entry_hash, entry_location, encoding, name) in list(self._entries.items()):
+                if now - created > self.ttl:
+                    self._remove(key)
+                    continue
+                if key in self._seen:
+                    continue  # already claimed by another face in this frame
+                if (bin(crop_hash ^ entry_hash).count("1") <= self.max_hamming
+                        and self._box_matches(location, entry_location)):
+                    self._entries[key] = (created, crop_hash, location, encoding, name)
+                    self._entries.move_to_end(key)
+                    self._seen.add(key)
+                    self.hits += 1
+                    return encoding, name
+            self.misses += 1
+            return None
+
+    def put(self, crop_hash, location, encoding, name, now=None):
+        """Stores an encoding and its match result, evicting the oldest entries if needed."""
+        if crop_hash is None:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = (now, crop_hash, tuple(location), encoding, name)
+            self._seen.add(key)
+            self._bytes += encoding.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def end_frame(self):
+        """Drops every entry that was not matched or stored since the previous call.
+
+        Called once per processed frame, including frames without faces, so an
+        entry only survives while its face stays continuously in view.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key not in self._seen]:
+                self._remove(key)
+            self._seen.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._seen.discard(key)
+        self._bytes -= entry[3].nbytes
+
+    def clear(self):
+        """Drops every entry, e.g. after the known faces have been reloaded."""
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns hit/miss counters and current memory usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+# ✅ Cache of recent encodings so a stationary face is not re-encoded every frame
+encoding_cache = EncodingCache()
+
+
+def _load_models():
+    """Imports face_recognition/dlib and loads the detector and predictor once (thread-safe)."""
+    global _face_recognition, _detector, _predictor
+
+    if _predictor is not None:
+        return
+    with _models_lock:
+        if _predictor is not None:
+            return
+        if not os.path.exists(LANDMARK_MODEL):
+            raise RuntimeError(f"❌ ERROR: Missing landmark model file: {LANDMARK_MODEL}")
+
+        from utils.startup import startup_timer
+        import dlib
+        import face_recognition
+        startup_timer.mark("face_recognition and dlib imported")
+
+        _face_recognition = face_recognition
+        _detector = dlib.get_frontal_face_detector()
+        _predictor = dlib.shape_predictor(LANDMARK_MODEL)
+        startup_timer.mark("dlib models loaded")
+
+
+def get_face_recognition():
+    """Returns the face_recognition module, importing it on first use."""
+    _load_models()
+    return _face_recognition
+
+
+def get_detector():
+    """Returns dlib's frontal face detector, loading it on first use."""
+    _load_models()
+    return _detector
+
+
+def get_predictor():
+    """Returns dlib's 68-point shape predictor, loading it on first use."""
+    _load_models()
+    return _predictor
+
+
+def _warm_up():
+    global warm_up_error, _warm_up_thread
+    from utils.startup import startup_timer
+    try:
+        _load_models()
+        load_known_faces()
+        startup_timer.mark("known faces loaded")
+        models_ready.set()
+        startup_timer.report()
+    except Exception as e:
+        warm_up_error = e
+        logger.exception("Face recognition warm-up failed: %s", e)
+    finally:
+        with _models_lock:
+            _warm_up_thread = None
+
+
+def warm_up(background=True):
+    """Loads models and known faces, by default in a background thread.
+
+    Safe to call more than once: no second warm-up starts while one is
+    running, and a call after a failed warm-up retries it. With
+    ``background=False`` it waits for the result and re-raises a failure.
+    """
+    global _warm_up_thread, warm_up_error
+
+    with _models_lock:
+        if models_ready.is_set():
+            return
+        thread = _warm_up_thread
+        if thread is None:
+            warm_up_error = None
+            thread = _warm_up_thread = threading.Thread(target=_warm_up, name="fr-warm-up", daemon=True)
+            thread.start()
+    if not background:
+        thread.join()
+        if warm_up_error is not None:
+            raise warm_up_error
+
+
+def is_ready():
+    """True once models and known faces are loaded and recognition can run.
+
+    While it is False, `warm_up_error` tells whether loading failed.
+    """
+    return models_ready.is_set()
+
+
 def extract_user_id(name):
     """Extracts the user ID from the image filename.
     Assumes user ID is the numeric part right before the file extension."""
@@ -38,6 +273,8 @@ def extract_user_id(name):
 
 def detect_blink(frame):
     """✅ Detects eye blinking to prevent fake face attacks."""
+    detector = get_detector()
+    predictor = get_predictor()
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     faces = detector(gray)
 
@@ -97,8 +334,11 @@ def update_known_faces():
     encodings_path = os.path.join(known_faces_folder, 'known_face_encodings.pkl')
     names_path = os.path.join(known_faces_folder, 'known_face_names.pkl')
 
+    face_recognition = get_face_recognition()
     known_face_encodings = []
     known_face_names = []
+    gallery_entries = []
+    encoding_cache.clear()
 
     test_faces = [f for f in os.listdir(test_faces_folder) if os.path.isfile(os.path.join(test_faces_folder, f))]
 
@@ -117,53 +357,68 @@ def update_known_faces():
                 print(f"❌ ERROR: Unable to read {file_path}. Skipping.")
                 continue
 
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_image, model="hog")
-            face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
-
-            if not face_encodings:
-                print(f"🚫 No face found in {face_file}, skipping.")
+            display_name = parse_display_name(face_file)
+            if display_name is None:
+                print(f"⚠️ Skipping file with invalid format: {face_file}")
                 continue
 
             try:
-                filename = os.path.splitext(face_file)[0]
-                match = re.match(r'^([A-Za-z]+)_([A-Za-z]+)\d*_(\d+)$', filename)
-
-                if match:
-                    first_name = match.group(1)
-                    last_name = match.group(2)
-                    emp_id = match.group(3)
-                    display_name = f"{emp_id} - {first_name} {last_name}"
-                else:
-                    print(f"⚠️ Skipping file with invalid format: {face_file}")
-                    continue  # ✅ This was missing before!
-
-                if len(face_encodings) > 1:
-                    print(f"⚠️ Multiple faces detected in {face_file}. Using the first encoding.")
-
-                known_face_encodings.append(face_encodings[0])
-                known_face_names.append(display_name)
-                print(f"✅ Added: {display_name}")
-
+                # ✅ Score the largest face (blur, size, pose, exposure) before enrolling it
+                result = enroll_photo(image, face_recognition, DETECTION_MODEL, NUM_JITTERS, LANDMARK_MODEL_SIZE)
             except Exception as e:
-                print(f"⚠️ Error parsing or processing {face_file}: {e}")
+                print(f"⚠️ Error processing {face_file}: {e}")
+                continue
+
+            if result is None:
+                print(f"🚫 No face found in {face_file}, skipping.")
+                continue
+            if result["faces"] > 1:
+                print(f"⚠️ Multiple faces detected in {face_file}. Using the largest face.")
+            if not result["accepted"]:
+                print(f"🚫 Rejected {face_file}: {', '.join(result['reasons'])}")
+
+            gallery_entries.append({
+                "file": face_file,
+                "name": display_name,
+                "encoding": result["encoding"],
+                "score": result["score"],
+                "accepted": result["accepted"],
+            })
+            if result["accepted"]:
+                print(f"✅ Added: {display_name} (quality {result['score']:.2f})")
+
+    # ✅ Keep the best photos of each person as a centroid / a few prototypes
+    gallery_entries = filter_enrollment(gallery_entries)
+    known_face_encodings, known_face_names = build_prototypes(gallery_entries)
 
     # ✅ Save the encodings and names
     with open(encodings_path, 'wb') as f:
         pickle.dump(known_face_encodings, f)
     with open(names_path, 'wb') as f:
         pickle.dump(known_face_names, f)
+    save_gallery(known_faces_folder, gallery_entries, DETECTION_MODEL, NUM_JITTERS, LANDMARK_MODEL_SIZE)
 
-    print(f"✅ Updated known faces: {len(known_face_encodings)} loaded.")
+    print(f"✅ Updated known faces: {len(set(known_face_names))} people, {len(known_face_encodings)} encodings.")
 
-def load_known_faces():
-    """✅ Loads known faces and names from saved pickle files, auto-updates if missing or empty."""
+def load_known_faces(rebuild=True):
+    """✅ Loads known faces and names from saved pickle files, auto-updates if missing or empty.
+
+    With ``rebuild=False`` nothing is re-encoded and the lists stay empty instead.
+    """
     global known_face_encodings, known_face_names  
 
     encodings_path = os.path.join(known_faces_folder, 'known_face_encodings.pkl')
     names_path = os.path.join(known_faces_folder, 'known_face_names.pkl')
 
     need_update = False
+    encoding_cache.clear()
+
+    # Prefer a gallery encoded with the configured model
+    gallery = load_gallery(known_faces_folder, DETECTION_MODEL, NUM_JITTERS, LANDMARK_MODEL_SIZE)
+    if gallery is not None:
+        known_face_encodings, known_face_names = gallery
+        print(f"✅ Loaded {len(known_face_encodings)} known faces from {DETECTION_MODEL} gallery.")
+        return
 
     # Check if pickle files exist
     if not os.path.exists(encodings_path) or not os.path.exists(names_path):
@@ -190,41 +445,56 @@ def load_known_faces():
             known_face_names = []
             need_update = True
 
-    if need_update:
+    if need_update and rebuild:
         update_known_faces()
 
 
-def recognize_faces(frame, thermal_frame=None):
+def recognize_faces(frame, thermal_frame=None, cache=None):
     """
     Recognizes faces in a video frame and optionally verifies them using a thermal frame.
+    `cache` overrides the module-wide encoding cache, e.g. one cache per camera.
     """
+    cache = encoding_cache if cache is None else cache
     face_names = []
 
     if frame is None:
         print("⚠️ ERROR: Frame is empty! Skipping recognition.")
         return face_names
 
+    face_recognition = get_face_recognition()
+
     # Convert frame to RGB
     rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     
     # Detect faces
-    face_locations = face_recognition.face_locations(rgb_frame, model="hog")
-    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-
-    for face_encoding, (top, right, bottom, left) in zip(face_encodings, face_locations):
-        matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=0.5)
-        face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
+    face_locations = face_recognition.face_locations(rgb_frame, model=DETECTION_MODEL)
+    if not face_locations:
+        cache.end_frame()  # nobody in view, forget every tracked face
+        return face_names
 
-        if len(face_distances) == 0:
-            face_names.append("Unknown")
+    # ✅ Reuse encodings of unchanged face crops, only encode the rest
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    crop_hashes = [EncodingCache.crop_hash(gray, location) for location in face_locations]
+    cached = [cache.get(h, location) for h, location in zip(crop_hashes, face_locations)]
+
+    missing = [i for i, entry in enumerate(cached) if entry is None]
+    if missing:
+        new_encodings = face_recognition.face_encodings(
+            rgb_frame, [face_locations[i] for i in missing],
+            num_jitters=NUM_JITTERS, model=LANDMARK_MODEL_SIZE
+        )
+        for i, face_encoding in zip(missing, new_encodings):
+            name = _match_encoding(face_encoding)
+            cache.put(crop_hashes[i], face_locations[i], face_encoding, name)
+            cached[i] = (face_encoding, name)
+    cache.end_frame()
+
+    for entry, (top, right, bottom, left) in zip(cached, face_locations):
+        if entry is None:
             continue
+        name = entry[1]
 
-        best_match_index = np.argmin(face_distances)
-        name = "Unknown"
-
-        if matches[best_match_index]:
-            name = known_face_names[best_match_index]
-
+        if name != "Unknown":
             if thermal_frame is not None:
                 # ✅ Add Thermal Verification (Optional)
                 h, w, _ = thermal_frame.shape
@@ -250,3 +520,16 @@ def recognize_faces(frame, thermal_frame=None):
     return face_names
 
 
+def _match_encoding(face_encoding):
+    """Returns the known name closest to the encoding, or "Unknown"."""
+    if len(known_face_encodings) == 0:
+        return "Unknown"
+
+    face_recognition = get_face_recognition()
+    matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=0.5)
+    face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
+    best_match_index = np.argmin(face_distances)
+
+    return known_face_names[best_match_index] if matches[best_match_index] else "Unknown"
+
+
@@ -0,0 +1,254 @@
+"""Versioned face galleries and the offline bulk re-encoding tool.
+
+A gallery is the set of known encodings produced by one detector/encoder
+configuration. Each gallery is saved as ``gallery_<tag>.pkl`` next to the
+legacy pickles, so galleries for HOG and CNN (or different jitter counts)
+can live side by side and the kiosk loads the one matching its config.
+
+Galleries are built and compared with the ``build_gallery.py`` script at the
+top of the project.
+"""
+import os
+import re
+import time
+import pickle
+import multiprocessing
+
+from core.quality import enroll_photo, filter_enrollment, build_prototypes
+
+GALLERY_VERSION = 2
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def parse_display_name(face_file):
+    """Turns ``First_Last[n]_<id>.jpg`` into ``"<id> - First Last"``, or None."""
+    filename = os.path.splitext(face_file)[0]
+    match = re.match(r'^([A-Za-z]+)_([A-Za-z]+)\d*_(\d+)$', filename)
+    if not match:
+        return None
+    first_name, last_name, emp_id = match.groups()
+    return f"{emp_id} - {first_name} {last_name}"
+
+
+def gallery_tag(model="hog", num_jitters=1, landmark_model="small"):
+    """Short identifier of an encoder configuration, e.g. ``hog_j1_small``."""
+    return f"{model}_j{num_jitters}_{landmark_model}"
+
+
+def gallery_path(folder, model="hog", num_jitters=1, landmark_model="small"):
+    return os.path.join(folder, f"gallery_{gallery_tag(model, num_jitters, landmark_model)}.pkl")
+
+
+def save_gallery(folder, entries, model="hog", num_jitters=1, landmark_model="small", stats=None):
+    """Writes a gallery atomically and returns its path.
+
+    ``entries`` is a list of ``{"file", "name", "encoding", "score", "accepted"}``
+    dicts, one per enrolled photo.
+    """
+    path = gallery_path(folder, model, num_jitters, landmark_model)
+    gallery = {
+        "version": GALLERY_VERSION,
+        "model": model,
+        "num_jitters": num_jitters,
+        "landmark_model": landmark_model,
+        "created": time.time(),
+        "entries": entries,
+        "stats": stats or {},
+    }
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(gallery, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_gallery(path):
+    """Loads a gallery file, returning None if it is missing, corrupt or outdated."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            gallery = pickle.load(f)
+    except (EOFError, pickle.UnpicklingError) as e:
+        print(f"❌ ERROR: Corrupt gallery {path}. ({e})")
+        return None
+    if not isinstance(gallery, dict) or gallery.get("version") != GALLERY_VERSION:
+        print(f"⚠️ Ignoring gallery {path} with unsupported version.")
+        return None
+    return gallery
+
+
+def load_gallery(folder, model="hog", num_jitters=1, landmark_model="small"):
+    """Returns ``(encodings, names)`` of the gallery matching the config, or None.
+
+    Per-photo entries are collapsed into per-identity prototypes.
+    """
+    gallery = read_gallery(gallery_path(folder, model, num_jitters, landmark_model))
+    if not gallery or not gallery["entries"]:
+        return None
+    return build_prototypes(gallery["entries"])
+
+
+def _encode_photo(job):
+    """Pool worker: returns ``(file, enrollment result or None, seconds)`` for one photo."""
+    import cv2
+    import face_recognition
+
+    file_path, model, num_jitters, landmark_model = job
+    started = time.perf_counter()
+    result = None
+
+    image = cv2.imread(file_path)
+    if image is not None:
+        result = enroll_photo(image, face_recognition, model, num_jitters, landmark_model)
+        if result is not None:
+            del result["reasons"]
+
+    return os.path.basename(file_path), result, time.perf_counter() - started
+
+
+def build_gallery(photo_folder, out_folder, model="hog", num_jitters=1,
+                  landmark_model="small", workers=None, checkpoint_every=50):
+    """Re-encodes every photo in ``photo_folder`` into a versioned gallery.
+
+    Work is spread over ``workers`` processes. Results are checkpointed to
+    ``<gallery>.v<version>.partial`` every ``checkpoint_every`` photos, and a rerun
+    after an interruption skips the photos already in the checkpoint.
+    """
+    path = gallery_path(out_folder, model, num_jitters, landmark_model)
+    checkpoint_path = f"{path}.v{GALLERY_VERSION}.partial"
+
+    done = {}
+    if os.path.exists(checkpoint_path):
+        try:
+            with open(checkpoint_path, 'rb') as f:
+                done = pickle.load(f)
+            print(f"🔄 Resuming from checkpoint with {len(done)} photos already encoded.")
+        except (EOFError, pickle.UnpicklingError):
+            print("⚠️ Corrupt checkpoint, starting over.")
+            done = {}
+
+    photos = sorted(
+        f for f in os.listdir(photo_folder)
+        if f.lower().endswith(IMAGE_EXTENSIONS) and parse_display_name(f)
+    )
+    jobs = [
+        (os.path.join(photo_folder, f), model, num_jitters, landmark_model)
+        for f in photos if f not in done
+    ]
+    print(f"🔍 Encoding {len(jobs)} of {len(photos)} photos with {gallery_tag(model, num_jitters, landmark_model)}...")
+
+    def save_checkpoint():
+        os.makedirs(out_folder, exist_ok=True)
+        with open(checkpoint_path + ".tmp", 'wb') as f:
+            pickle.dump(done, f)
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(processes=workers) as pool:
+        for count, (face_file, result, seconds) in enumerate(pool.imap_unordered(_encode_photo, jobs), 1):
+            done[face_file] = (result, seconds)
+            if result is None:
+                print(f"🚫 No face found in {face_file}, skipping.")
+            if count % checkpoint_every == 0:
+                save_checkpoint()
+                print(f"⏳ {count}/{len(jobs)} photos encoded.")
+    elapsed = time.perf_counter() - started
+
+    entries = [
+        {
+            "file": f,
+            "name": parse_display_name(f),
+            "encoding": done[f][0]["encoding"],
+            "score": done[f][0]["score"],
+            "accepted": done[f][0]["accepted"],
+        }
+        for f in photos if f in done and done[f][0] is not None
+    ]
+    faces_found = len(entries)
+    entries = filter_enrollment(entries)
+    stats = {
+        "images": len(photos),
+        "faces_found": faces_found,
+        "enrolled": len(entries),
+        "encode_seconds": sum(done[f][1] for f in photos if f in done),
+        "wall_seconds": elapsed,
+        "images_per_second": len(jobs) / elapsed if jobs and elapsed > 0 else 0.0,
+    }
+    saved = save_gallery(out_folder, entries, model, num_jitters, landmark_model, stats)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    print(f"✅ Saved {len(entries)} encodings to {saved}.")
+    return saved
+
+
+def evaluate_gallery(gallery, tolerance=0.5):
+    """Leave-one-out identification over identities with several photos.
+
+    Each encoding is matched against the rest of the gallery; a match is
+    correct when the nearest neighbour within ``tolerance`` has the same name.
+    """
+    import numpy as np
+
+    entries = gallery["entries"]
+    if len(entries) < 2:
+        return {"probes": 0, "rank1_accuracy": 0.0, "false_accepts": 0, "rejects": 0}
+
+    encodings = np.array([entry["encoding"] for entry in entries])
+    names = [entry["name"] for entry in entries]
+    counts = {name: names.count(name) for name in names}
+
+    probes = correct = false_accepts = rejects = 0
+    for i, name in enumerate(names):
+        if counts[name] < 2:
+            continue
+        distances = np.linalg.norm(encodings - encodings[i], axis=1)
+        distances[i] = np.inf
+        best = int(np.argmin(distances))
+        probes += 1
+        if distances[best] > tolerance:
+            rejects += 1
+        elif names[best] == name:
+            correct += 1
+        else:
+            false_accepts += 1
+
+    return {
+        "probes": probes,
+        "rank1_accuracy": correct / probes if probes else 0.0,
+        "false_accepts": false_accepts,
+        "rejects": rejects,
+    }
+
+
+def compare_galleries(paths, tolerance=0.5):
+    """Prints a throughput and accuracy table for several galleries."""
+    rows = []
+    for path in paths:
+        gallery = read_gallery(path)
+        if gallery is None:
+            continue
+        stats = gallery.get("stats", {})
+        images = stats.get("images") or 0
+        faces_found = stats.get("faces_found", len(gallery["entries"]))
+        row = {
+            "tag": gallery_tag(gallery["model"], gallery["num_jitters"], gallery["landmark_model"]),
+            "images_per_second": stats.get("images_per_second", 0.0),
+            "ms_per_image": 1000 * stats.get("encode_seconds", 0.0) / images if images else 0.0,
+            "detection_rate": faces_found / images if images else 0.0,
+        }
+        row.update(evaluate_gallery(gallery, tolerance))
+        rows.append(row)
+
+    header = f"{'gallery':<20} {'img/s':>8} {'ms/img':>8} {'detect':>8} {'probes':>7} {'rank-1':>8} {'FA':>4} {'rej':>4}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['tag']:<20} {row['images_per_second']:>8.2f} {row['ms_per_image']:>8.1f} "
+            f"{row['detection_rate']:>8.1%} {row['probes']:>7} {row['rank1_accuracy']:>8.1%} "
+            f"{row['false_accepts']:>4} {row['rejects']:>4}"
+        )
+    return rows
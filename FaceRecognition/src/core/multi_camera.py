@@ -0,0 +1,382 @@
+"""Serves several visual+thermal camera pairs from one box.
+
+Each stream is decoded in its own thread in the parent process, and the
+latest frame pair of every entrance is published into a shared-memory
+FrameSlot. Recognition runs in worker processes, each owning a shard of the
+camera pairs, so dlib work is spread across cores instead of sharing one GIL.
+The known face encodings are placed once in shared memory and mapped
+read-only by every worker. Workers are spawned, not forked, so they never
+inherit locks held by the decode threads.
+
+Pairs are configured with CAMERA_PAIRS, a comma separated list of
+``name:visual_channel:thermal_channel[:device_id]`` entries, e.g.
+``CAMERA_PAIRS=front:1:2:1,back:3:4:2``.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from core.camera import CameraStreamManager, nvr_rtsp_url
+
+logger = logging.getLogger(__name__)
+
+ENCODING_SIZE = 128
+
+
+class CameraPair:
+    """One entrance: a visual and a thermal RTSP stream plus its device ID."""
+
+    def __init__(self, name, visual_url, thermal_url, device_id=1):
+        self.name = name
+        self.visual_url = visual_url
+        self.thermal_url = thermal_url
+        self.device_id = device_id
+
+    def __repr__(self):
+        return f"CameraPair({self.name!r}, device_id={self.device_id})"
+
+
+def camera_pairs_from_env():
+    """Parses CAMERA_PAIRS; defaults to the single channel 1/2 pair of the kiosk."""
+    pairs = []
+    for entry in os.getenv("CAMERA_PAIRS", "main:1:2:1").split(","):
+        if not entry.strip():
+            continue
+        parts = entry.strip().split(":")
+        if len(parts) not in (3, 4):
+            raise ValueError(f"Invalid CAMERA_PAIRS entry: {entry!r}")
+        name, visual, thermal = parts[:3]
+        device_id = int(parts[3]) if len(parts) == 4 else len(pairs) + 1
+        pairs.append(CameraPair(name, nvr_rtsp_url(visual), nvr_rtsp_url(thermal), device_id))
+    return pairs
+
+
+class FrameSlot:
+    """Latest visual+thermal frame pair of one entrance, in shared memory.
+
+    Layout: sequence number (int64), capture time (float64), then the visual
+    and thermal frames. Access is guarded by a process-shared lock, which must
+    come from the same multiprocessing context as the processes using it.
+    """
+
+    HEADER = 16
+
+    def __init__(self, height, width, name=None, lock=None):
+        self.height = height
+        self.width = width
+        frame_bytes = height * width * 3
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.HEADER + 2 * frame_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.lock = lock or multiprocessing.Lock()
+
+        buf = self.shm.buf
+        self._seq = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=0)
+        self._captured_at = np.ndarray((1,), dtype=np.float64, buffer=buf, offset=8)
+        self._visual = np.ndarray((height, width, 3), dtype=np.uint8, buffer=buf, offset=self.HEADER)
+        self._thermal = np.ndarray(
+            (height, width, 3), dtype=np.uint8, buffer=buf, offset=self.HEADER + frame_bytes
+        )
+        if name is None:
+            self._seq[0] = 0
+
+    def spec(self):
+        """Picklable description used to attach to the slot from a worker."""
+        return self.shm.name, self.height, self.width, self.lock
+
+    @classmethod
+    def attach(cls, spec):
+        name, height, width, lock = spec
+        return cls(height, width, name=name, lock=lock)
+
+    def write(self, visual, thermal, captured_at):
+        with self.lock:
+            self._visual[:] = visual
+            self._thermal[:] = thermal
+            self._captured_at[0] = captured_at
+            self._seq[0] += 1
+
+    def read_if_newer(self, last_seq):
+        """Returns ``(seq, visual, thermal, captured_at)`` copies, or None if nothing new."""
+        with self.lock:
+            seq = int(self._seq[0])
+            if seq <= last_seq:
+                return None
+            return seq, self._visual.copy(), self._thermal.copy(), float(self._captured_at[0])
+
+    def close(self):
+        # drop the numpy views first, the buffer cannot be closed while exported
+        self._seq = self._captured_at = self._visual = self._thermal = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class SharedGallery:
+    """Known face encodings in one shared-memory block, mapped read-only by workers."""
+
+    def __init__(self, encodings, names):
+        count = len(encodings)
+        self.names = list(names)
+        self.count = count
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, count * ENCODING_SIZE * 8))
+        if count:
+            array = np.ndarray((count, ENCODING_SIZE), dtype=np.float64, buffer=self.shm.buf)
+            array[:] = np.asarray(encodings, dtype=np.float64)
+            del array
+
+    def spec(self):
+        return self.shm.name, self.count, self.names
+
+    @staticmethod
+    def attach(spec):
+        """Returns ``(shm, encodings, names)``; the encodings array is read-only."""
+        name, count, names = spec
+        shm = shared_memory.SharedMemory(name=name)
+        encodings = np.ndarray((count, ENCODING_SIZE), dtype=np.float64, buffer=shm.buf)
+        encodings.flags.writeable = False
+        return shm, encodings, names
+
+    def unlink(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def recognition_worker(shard, gallery_spec, events, stop, upload_path):
+    """Worker process: runs recognition and punches for its shard of camera pairs.
+
+    ``shard`` is a list of ``(pair_name, device_id, slot_spec)`` tuples.
+    """
+    from core import fr
+    from core.attendance import PunchGate, MySQLAttendanceStore, save_punch_photo, PUNCH
+    from core.scheduler import InferenceScheduler
+
+    # load dlib models, then point fr at the shared gallery instead of the pickles
+    fr.get_predictor()
+    gallery_shm, fr.known_face_encodings, fr.known_face_names = SharedGallery.attach(gallery_spec)
+    fr.models_ready.set()
+
+    entrances = []
+    for pair_name, device_id, slot_spec in shard:
+        entrances.append({
+            "name": pair_name,
+            "slot": FrameSlot.attach(slot_spec),
+            "seq": 0,
+            "gate": PunchGate(),
+            "store": MySQLAttendanceStore(device_id=device_id),
+            "scheduler": InferenceScheduler.from_env(),
+            "cache": fr.EncodingCache(),
+        })
+
+    while not stop.is_set():
+        busy = False
+        for entrance in entrances:
+            if not entrance["scheduler"].due():
+                continue
+            latest = entrance["slot"].read_if_newer(entrance["seq"])
+            if latest is None:
+                continue
+            entrance["seq"], frame, thermal_frame, captured_at = latest
+            if not frame.any():
+                continue
+            busy = True
+
+            try:
+                started = time.monotonic()
+                names = fr.recognize_faces(
+                    frame, thermal_frame if thermal_frame.any() else None, cache=entrance["cache"]
+                )
+                gate = entrance["gate"]
+                now = datetime.now()
+                for event, name, uid in gate.process(names, frame, now, fr.detect_blink):
+                    if event == PUNCH:
+                        store = entrance["store"]
+                        punch_type = store.get_punch_type(uid)
+                        photo_url = save_punch_photo(frame, name, uid, upload_path)
+                        store.record_punch(uid, punch_type, photo_url, now)
+                        name = f"{name} ({punch_type})"
+                    events.put((entrance["name"], event, name, uid, time.time() - captured_at))
+                # the whole pass counts: recognition, blink check, photo and database
+                entrance["scheduler"].record(
+                    time.monotonic() - started, active=bool(names) or gate.fake_face_counter > 0
+                )
+            except Exception as e:
+                # one failing entrance (e.g. a database outage) must not stop the others
+                logger.exception("[%s] Recognition failed: %s", entrance["name"], e)
+        if not busy:
+            time.sleep(0.01)
+
+    for entrance in entrances:
+        entrance["slot"].close()
+    fr.known_face_encodings = []
+    gallery_shm.close()
+
+
+class MultiCameraManager:
+    """Decodes N camera pairs and shards their recognition across worker processes.
+
+    A supervisor thread restarts recognition workers that die, with an
+    exponential backoff of up to ``max_restart_delay`` seconds.
+    """
+
+    def __init__(self, pairs, workers=None, target_height=480, target_width=640,
+                 upload_path="/mnt/nfs_uploads", on_event=None, max_restart_delay=60):
+        self.pairs = pairs
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(pairs)))
+        self.target_height = target_height
+        self.target_width = target_width
+        self.upload_path = upload_path
+        self.on_event = on_event
+        self.max_restart_delay = max_restart_delay
+
+        self.slots = {}
+        self.streams = {}
+        self.decode_threads = []
+        self.gallery = None
+        self.processes = []
+        self.shards = []
+        self.restarts = []
+        self._failures = []     # consecutive short-lived runs, drives the backoff
+        self._started_at = []
+        self._restart_at = []
+        # spawn: forking next to the FFmpeg reader threads can copy a held lock
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self._running = False
+
+    def start(self):
+        from core import fr
+
+        os.makedirs(self.upload_path, exist_ok=True)
+        fr.load_known_faces()
+        self.gallery = SharedGallery(fr.known_face_encodings, fr.known_face_names)
+        logger.info("Shared gallery with %d encodings", self.gallery.count)
+
+        for pair in self.pairs:
+            self.slots[pair.name] = FrameSlot(self.target_height, self.target_width, lock=self.context.Lock())
+
+        # round-robin pairs over the worker processes, started before any decode thread
+        for index in range(self.workers):
+            self.shards.append([
+                (pair.name, pair.device_id, self.slots[pair.name].spec())
+                for pair in self.pairs[index::self.workers]
+            ])
+            self.restarts.append(0)
+            self._failures.append(0)
+            self._started_at.append(None)
+            self._restart_at.append(None)
+            self.processes.append(self._start_worker(index))
+        logger.info("Serving %d camera pairs with %d recognition workers", len(self.pairs), self.workers)
+
+        self._running = True
+        for pair in self.pairs:
+            thread = threading.Thread(target=self._decode, args=(pair,), name=f"decode-{pair.name}", daemon=True)
+            thread.start()
+            self.decode_threads.append(thread)
+
+        threading.Thread(target=self._drain_events, name="recognition-events", daemon=True).start()
+        threading.Thread(target=self._supervise, name="recognition-supervisor", daemon=True).start()
+
+    def _start_worker(self, index):
+        process = self.context.Process(
+            target=recognition_worker,
+            args=(self.shards[index], self.gallery.spec(), self.events, self.stop_event, self.upload_path),
+            name=f"recognition-{index}",
+            daemon=True
+        )
+        process.start()
+        self._started_at[index] = time.monotonic()
+        return process
+
+    def _supervise(self):
+        """Restarts dead recognition workers, backing off while they keep dying."""
+        while self._running:
+            for index, process in enumerate(self.processes):
+                if process.is_alive() or not self._running:
+                    continue
+                now = time.monotonic()
+                if self._restart_at[index] is None:
+                    if now - self._started_at[index] > self.max_restart_delay:
+                        self._failures[index] = 0
+                    delay = min(2 ** self._failures[index], self.max_restart_delay)
+                    self._failures[index] += 1
+                    self._restart_at[index] = now + delay
+                    logger.error(
+                        "%s exited with code %s, restarting in %.0fs",
+                        process.name, process.exitcode, delay
+                    )
+                elif now >= self._restart_at[index]:
+                    self._restart_at[index] = None
+                    self.restarts[index] += 1
+                    self.processes[index] = self._start_worker(index)
+            time.sleep(1)
+
+    def _decode(self, pair):
+        """Opens the pair's streams and publishes every new frame pair to its slot."""
+        manager = CameraStreamManager(
+            visual_url=pair.visual_url,
+            thermal_url=pair.thermal_url,
+            target_height=self.target_height,
+            target_width=self.target_width
+        )
+        self.streams[pair.name] = manager
+        slot = self.slots[pair.name]
+        last_visual = None
+        while self._running:
+            visual = manager.frames['frame']
+            if visual is last_visual:
+                time.sleep(0.005)
+                continue
+            last_visual = visual
+            slot.write(visual, manager.frames['thermal_frame'], time.time())
+
+    def _drain_events(self):
+        while self._running:
+            try:
+                pair_name, event, name, uid, latency = self.events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            logger.info("[%s] %s %s (%.0f ms after capture)", pair_name, event, name, latency * 1000)
+            if self.on_event:
+                self.on_event(pair_name, event, name, uid, latency)
+
+    def health(self):
+        """Stream and recognition worker health of every camera pair, keyed by pair name."""
+        health = {name: dict(manager.health()) for name, manager in self.streams.items()}
+        for index, shard in enumerate(self.shards):
+            process = self.processes[index]
+            worker = {
+                "worker": process.name,
+                "alive": process.is_alive(),
+                "restarts": self.restarts[index],
+                "exitcode": process.exitcode,
+            }
+            for pair_name, _, _ in shard:
+                health.setdefault(pair_name, {})["recognition"] = worker
+        return health
+
+    def stop(self):
+        self._running = False
+        # no decode thread may still be writing when the slots are closed
+        for thread in self.decode_threads:
+            thread.join(timeout=5)
+        for manager in self.streams.values():
+            manager.stop()
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+        for slot in self.slots.values():
+            slot.close()
+            slot.unlink()
+        if self.gallery is not None:
+            self.gallery.unlink()
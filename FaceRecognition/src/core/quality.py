@@ -0,0 +1,180 @@
+"""Enrollment photo quality checks and per-identity prototypes.
+
+Every enrollment face is scored on sharpness, size, pose and exposure.
+Faces failing a hard limit are rejected, the rest are ranked, and each
+identity is stored as a centroid (or a few diverse prototypes) of its best
+photos, so the kiosk compares against fewer, cleaner encodings.
+"""
+import os
+import cv2
+import numpy as np
+
+MIN_BLUR = 60.0          # variance of the Laplacian on the normalized crop
+GOOD_BLUR = 300.0
+MIN_FACE_SIZE = 80       # pixels, face box height
+GOOD_FACE_SIZE = 200
+MAX_YAW = 0.18           # nose offset from the eye midpoint, as a fraction of eye distance
+MAX_ROLL = 15.0          # degrees between the eyes
+MIN_BRIGHTNESS = 60
+MAX_BRIGHTNESS = 200
+MAX_CLIPPED = 0.15       # fraction of crop pixels that are under/over exposed
+
+# Enrollment settings; ENROLL_PROTOTYPES=1 stores a single centroid per identity
+ENROLL_PROTOTYPES = int(os.getenv("ENROLL_PROTOTYPES", "1"))
+ENROLL_MAX_PHOTOS = int(os.getenv("ENROLL_MAX_PHOTOS", "5"))
+
+
+def largest_face(face_locations):
+    """Returns the biggest ``(top, right, bottom, left)`` box, or None."""
+    if not face_locations:
+        return None
+    return max(face_locations, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))
+
+
+def _pose(landmarks):
+    """Returns ``(yaw, roll)`` estimated from the eye and nose landmarks."""
+    left_eye = np.mean(landmarks["left_eye"], axis=0)
+    right_eye = np.mean(landmarks["right_eye"], axis=0)
+    nose = np.mean(landmarks["nose_tip"], axis=0)
+
+    eye_distance = np.linalg.norm(right_eye - left_eye)
+    if eye_distance == 0:
+        return 1.0, 90.0
+    midpoint = (left_eye + right_eye) / 2
+    yaw = abs(nose[0] - midpoint[0]) / eye_distance
+    dy, dx = right_eye[1] - left_eye[1], right_eye[0] - left_eye[0]
+    roll = abs(np.degrees(np.arctan2(dy, dx)))
+    return yaw, roll
+
+
+def assess_face(image, location, landmarks=None):
+    """Scores one face of a BGR image.
+
+    Returns a dict with the individual measurements, an overall ``score``
+    between 0 and 1, and ``reasons`` listing every failed hard limit.
+    """
+    top, right, bottom, left = location
+    h, w = image.shape[:2]
+    crop = image[max(0, top):min(h, bottom), max(0, left):min(w, right)]
+    reasons = []
+    if crop.size == 0:
+        return {"score": 0.0, "reasons": ["empty crop"]}
+
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    # normalize the crop size so blur is comparable across photos
+    normalized = cv2.resize(gray, (128, 128), interpolation=cv2.INTER_AREA)
+    blur = float(cv2.Laplacian(normalized, cv2.CV_64F).var())
+    size = bottom - top
+    brightness = float(gray.mean())
+    clipped = float(np.mean((gray < 5) | (gray > 250)))
+
+    if blur < MIN_BLUR:
+        reasons.append(f"blurry ({blur:.0f})")
+    if size < MIN_FACE_SIZE:
+        reasons.append(f"face too small ({size}px)")
+    if not MIN_BRIGHTNESS <= brightness <= MAX_BRIGHTNESS or clipped > MAX_CLIPPED:
+        reasons.append(f"poor exposure (mean {brightness:.0f}, clipped {clipped:.0%})")
+
+    yaw = roll = 0.0
+    if landmarks:
+        yaw, roll = _pose(landmarks)
+        if yaw > MAX_YAW:
+            reasons.append(f"head turned ({yaw:.2f})")
+        if roll > MAX_ROLL:
+            reasons.append(f"head tilted ({roll:.0f}°)")
+
+    exposure_score = 1.0 - min(abs(brightness - 128) / 128, 1.0)
+    score = (
+        0.35 * min(blur / GOOD_BLUR, 1.0)
+        + 0.2 * min(size / GOOD_FACE_SIZE, 1.0)
+        + 0.25 * max(0.0, 1.0 - yaw / MAX_YAW) * max(0.0, 1.0 - roll / MAX_ROLL)
+        + 0.2 * exposure_score * (1.0 - clipped)
+    )
+    return {
+        "score": score,
+        "blur": blur,
+        "size": size,
+        "yaw": yaw,
+        "roll": roll,
+        "brightness": brightness,
+        "clipped": clipped,
+        "reasons": reasons,
+    }
+
+
+def enroll_photo(image, face_recognition, model="hog", num_jitters=1, landmark_model="small"):
+    """Detects, scores and encodes the largest face of a BGR enrollment photo.
+
+    Returns None when no face is found, otherwise a dict with ``encoding``,
+    ``score``, ``accepted``, ``reasons`` and the number of ``faces`` seen.
+    """
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    face_locations = face_recognition.face_locations(rgb_image, model=model)
+    location = largest_face(face_locations)
+    if location is None:
+        return None
+
+    landmarks = face_recognition.face_landmarks(rgb_image, [location])
+    quality = assess_face(image, location, landmarks[0] if landmarks else None)
+    encoding = face_recognition.face_encodings(
+        rgb_image, [location], num_jitters=num_jitters, model=landmark_model
+    )[0]
+    return {
+        "encoding": encoding,
+        "score": quality["score"],
+        "accepted": not quality["reasons"],
+        "reasons": quality["reasons"],
+        "faces": len(face_locations),
+    }
+
+
+def filter_enrollment(entries):
+    """Keeps accepted entries, plus the best rejected one for identities with none.
+
+    Entries are dicts with ``name``, ``file``, ``score`` and ``accepted``; a
+    person whose every photo fails still gets enrolled with their best photo.
+    """
+    kept = [entry for entry in entries if entry.get("accepted", True)]
+    enrolled = {entry["name"] for entry in kept}
+    fallbacks = {}
+    for entry in entries:
+        if entry["name"] in enrolled:
+            continue
+        best = fallbacks.get(entry["name"])
+        if best is None or entry.get("score", 0.0) > best.get("score", 0.0):
+            fallbacks[entry["name"]] = entry
+    for name, entry in fallbacks.items():
+        print(f"⚠️ No photo of {name} passed the quality check, using {entry['file']}.")
+    return kept + list(fallbacks.values())
+
+
+def build_prototypes(entries, max_prototypes=ENROLL_PROTOTYPES, max_photos=ENROLL_MAX_PHOTOS):
+    """Collapses per-photo entries into a few encodings per identity.
+
+    Uses the ``max_photos`` best-scoring photos of each identity. With one
+    prototype the result is their centroid; otherwise a greedy farthest-point
+    pick keeps the most distinct encodings. Returns ``(encodings, names)``.
+    """
+    by_name = {}
+    for entry in entries:
+        by_name.setdefault(entry["name"], []).append(entry)
+
+    encodings, names = [], []
+    for name, group in by_name.items():
+        group.sort(key=lambda entry: entry.get("score", 1.0), reverse=True)
+        vectors = np.array([entry["encoding"] for entry in group[:max_photos]])
+
+        if max_prototypes <= 1:
+            prototypes = [vectors.mean(axis=0)]
+        else:
+            chosen = [0]
+            while len(chosen) < min(max_prototypes, len(vectors)):
+                distances = np.min(
+                    [np.linalg.norm(vectors - vectors[i], axis=1) for i in chosen], axis=0
+                )
+                chosen.append(int(np.argmax(distances)))
+            prototypes = [vectors[i] for i in chosen]
+
+        encodings.extend(prototypes)
+        names.extend([name] * len(prototypes))
+    return encodings, names
@@ -0,0 +1,278 @@
+"""Replays recorded visual+thermal sessions through the full kiosk pipeline.
+
+Frames go through recognize_faces -> blink liveness -> PunchGate, and punches
+are written to a local SQLite stand-in for the HR database. Like the kiosk,
+recognition only runs when the InferenceScheduler says a pass is due
+(``--every-frame`` runs it on every delivered frame instead). The report gives
+throughput, end-to-end latency and correct/incorrect punch counts, so every
+pipeline change can be load-tested against the same recording.
+
+Usage (from the ``src`` folder):
+    python -m core.replay visual.mp4 --thermal thermal.mp4 --expect 12,34
+    python -m core.replay frames/visual/ --thermal frames/thermal/ --fps 10 --fast
+    python -m core.replay visual.mp4 --known-faces test_faces/known --photos test_faces/photos
+"""
+import os
+import time
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+from core.camera import letterbox
+from core.attendance import PunchGate, SQLiteAttendanceStore, UNKNOWN, FAKE_FACE_LOCKOUT, PUNCH
+from core.scheduler import InferenceScheduler
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameSequence:
+    """Reads frames from a video file or a folder of images in name order."""
+
+    def __init__(self, path, fps=None):
+        self.path = path
+        self.images = None
+        self.cap = None
+        self.position = 0
+
+        if os.path.isdir(path):
+            self.images = sorted(
+                os.path.join(path, f) for f in os.listdir(path)
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            self.fps = fps or 10.0
+        else:
+            self.cap = cv2.VideoCapture(path)
+            if not self.cap.isOpened():
+                raise RuntimeError(f"Unable to open replay source {path}")
+            self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 10.0
+
+    def grab(self):
+        """Skips one frame without decoding it; returns False at the end."""
+        if self.images is not None:
+            self.position += 1
+            return self.position <= len(self.images)
+        return self.cap.grab()
+
+    def read(self):
+        if self.images is not None:
+            if self.position >= len(self.images):
+                return False, None
+            frame = cv2.imread(self.images[self.position])
+            self.position += 1
+            return frame is not None, frame
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class ReplaySource:
+    """Yields ``(index, frame, thermal_frame, captured_at)`` from a recording.
+
+    In real-time mode frames are paced at the recording's frame rate and
+    frames that the pipeline was too slow to pick up are dropped, like a live
+    RTSP feed with a one-frame buffer. Otherwise every frame is delivered as
+    fast as the consumer asks for it.
+    """
+
+    def __init__(self, visual_path, thermal_path=None, fps=None, realtime=True,
+                 target_width=640, target_height=480):
+        self.visual = FrameSequence(visual_path, fps)
+        self.thermal = FrameSequence(thermal_path, self.visual.fps) if thermal_path else None
+        self.fps = self.visual.fps
+        self.realtime = realtime
+        self.target_width = target_width
+        self.target_height = target_height
+        self.dropped = 0
+
+    def _skip(self, count):
+        for _ in range(count):
+            if not self.visual.grab():
+                return False
+            if self.thermal is not None:
+                self.thermal.grab()
+        return True
+
+    def __iter__(self):
+        start = time.monotonic()
+        index = 0
+        try:
+            while True:
+                if self.realtime:
+                    due = int((time.monotonic() - start) * self.fps)
+                    if due > index:
+                        if not self._skip(due - index):
+                            return
+                        self.dropped += due - index
+                        index = due
+                    else:
+                        time.sleep(max(0.0, start + index / self.fps - time.monotonic()))
+
+                ok, frame = self.visual.read()
+                if not ok:
+                    return
+                thermal_frame = None
+                if self.thermal is not None:
+                    ok, thermal_frame = self.thermal.read()
+                    thermal_frame = thermal_frame if ok else None
+
+                captured_at = start + index / self.fps if self.realtime else time.monotonic()
+                yield (
+                    index,
+                    letterbox(frame, self.target_width, self.target_height),
+                    letterbox(thermal_frame, self.target_width, self.target_height),
+                    captured_at,
+                )
+                index += 1
+        finally:
+            self.visual.release()
+            if self.thermal is not None:
+                self.thermal.release()
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_replay(source, store=None, gate=None, expected_ids=None,
+               known_faces_folder=None, photos_folder=None, scheduler=None, use_scheduler=True):
+    """Runs `source` through the pipeline and returns a report dict.
+
+    Passes are paced by `scheduler` (the kiosk's INFERENCE_* settings by
+    default) unless ``use_scheduler`` is False. In fast mode the scheduler
+    follows the recording clock, so the same frames are picked as in real time.
+    ``known_faces_folder`` and ``photos_folder`` replace the kiosk's gallery and
+    enrollment photo folders, so a replay can run away from the kiosk.
+    """
+    from core import fr
+
+    if known_faces_folder:
+        fr.known_faces_folder = known_faces_folder
+    if photos_folder:
+        fr.test_faces_folder = photos_folder
+    fr.warm_up(background=False)
+    store = store or SQLiteAttendanceStore()
+    gate = gate or PunchGate()
+    if use_scheduler and scheduler is None:
+        scheduler = InferenceScheduler.from_env()
+    session_start = datetime.now()
+
+    frames = passes = 0
+    frame_latencies = []
+    punch_latencies = []
+    time_to_punch = []
+    first_seen = {}
+    counts = {UNKNOWN: 0, FAKE_FACE_LOCKOUT: 0, PUNCH: 0}
+    correct = incorrect = repeated = 0
+    punched = set()
+
+    started = time.monotonic()
+    for index, frame, thermal_frame, captured_at in source:
+        frames += 1
+        clock = None if source.realtime else index / source.fps
+        if use_scheduler and not scheduler.due(clock):
+            continue
+
+        # the gate runs on recording time so replays are repeatable
+        now = session_start + timedelta(seconds=index / source.fps)
+        pass_started = time.monotonic()
+        names = fr.recognize_faces(frame, thermal_frame)
+        for name in names:
+            first_seen.setdefault(name, now)
+
+        for event, name, uid in gate.process(names, frame, now, fr.detect_blink):
+            counts[event] += 1
+            if event != PUNCH:
+                continue
+            store.record_punch(uid, store.get_punch_type(uid), f"replay://{index}", now)
+            punch_latencies.append(time.monotonic() - captured_at)
+            time_to_punch.append((now - first_seen.pop(name, now)).total_seconds())
+            if expected_ids is not None:
+                # each expected person counts once, later punches are repeats
+                if uid not in expected_ids:
+                    incorrect += 1
+                elif uid in punched:
+                    repeated += 1
+                else:
+                    correct += 1
+            punched.add(uid)
+
+        if use_scheduler:
+            latency = time.monotonic() - pass_started
+            scheduler.record(
+                latency, active=bool(names) or gate.fake_face_counter > 0,
+                now=None if clock is None else clock + latency
+            )
+        frame_latencies.append(time.monotonic() - captured_at)
+        passes += 1
+    elapsed = time.monotonic() - started
+
+    return {
+        "frames": frames,
+        "dropped_frames": source.dropped,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "inference_passes": passes,
+        "inference_fps": passes / elapsed if elapsed > 0 else 0.0,
+        "skipped_frames": frames - passes,
+        "frame_latency_p50_ms": 1000 * _percentile(frame_latencies, 50),
+        "frame_latency_p95_ms": 1000 * _percentile(frame_latencies, 95),
+        "punch_latency_p50_ms": 1000 * _percentile(punch_latencies, 50),
+        "punch_latency_max_ms": 1000 * max(punch_latencies, default=0.0),
+        "time_to_punch_p50_s": _percentile(time_to_punch, 50),
+        "punches": counts[PUNCH],
+        "correct_punches": correct if expected_ids is not None else None,
+        "incorrect_punches": incorrect if expected_ids is not None else None,
+        "repeated_punches": repeated if expected_ids is not None else None,
+        "missed_punches": sorted(expected_ids - punched) if expected_ids is not None else None,
+        "unknown_events": counts[UNKNOWN],
+        "fake_face_lockouts": counts[FAKE_FACE_LOCKOUT],
+        "encoding_cache": fr.encoding_cache.stats(),
+        "scheduler": scheduler.stats() if use_scheduler else None,
+    }
+
+
+def print_report(report):
+    print("📊 Replay report")
+    for key, value in report.items():
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        print(f"  {key:<22} {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded session through the kiosk pipeline.")
+    parser.add_argument("visual", help="visual video file or folder of frames")
+    parser.add_argument("--thermal", help="thermal video file or folder of frames")
+    parser.add_argument("--fps", type=float, default=None, help="frame rate for image folders")
+    parser.add_argument("--fast", action="store_true", help="deliver frames as fast as possible")
+    parser.add_argument("--every-frame", action="store_true",
+                        help="run recognition on every frame instead of the kiosk's scheduler cadence")
+    parser.add_argument("--db", default=":memory:", help="SQLite file for recorded punches")
+    parser.add_argument("--expect", default=None, help="comma separated user IDs expected to punch")
+    parser.add_argument("--known-faces", default=None, help="folder with the gallery or encoding pickles")
+    parser.add_argument("--photos", default=None, help="enrollment photos used when --known-faces has no encodings")
+    args = parser.parse_args(argv)
+
+    expected_ids = None
+    if args.expect:
+        expected_ids = {int(uid) for uid in args.expect.split(",") if uid.strip()}
+
+    source = ReplaySource(args.visual, args.thermal, fps=args.fps, realtime=not args.fast)
+    report = run_replay(
+        source, SQLiteAttendanceStore(args.db), expected_ids=expected_ids,
+        known_faces_folder=args.known_faces, photos_folder=args.photos,
+        use_scheduler=not args.every_frame
+    )
+    print_report(report)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,108 @@
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceScheduler:
+    """Decides when the next recognition pass should run.
+
+    Paces the recognition thread while the display refreshes at its own
+    cadence; inference runs only when `due()` says so. The interval shrinks
+    while a face is being verified, grows towards `idle_interval` when nobody
+    is in front of the camera, and is stretched whenever recognition is slower
+    than its latency budget or the CPU has little headroom left.
+    """
+
+    def __init__(self, active_interval=0.1, idle_interval=0.5,
+                 min_interval=0.05, max_interval=2.0,
+                 latency_budget=0.25, max_duty=0.6, cpu_headroom=0.2,
+                 idle_after=3.0, smoothing=0.3):
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.latency_budget = latency_budget  # seconds one recognition pass may take
+        self.max_duty = max_duty              # fraction of time the recognition thread may be busy
+        self.cpu_headroom = cpu_headroom      # fraction of CPU to leave free
+        self.idle_after = idle_after          # seconds without faces before backing off
+        self.smoothing = smoothing
+
+        self.interval = idle_interval
+        self.latency = 0.0
+        self.next_run = 0.0
+        self.last_active = None
+        self.runs = 0
+
+    @classmethod
+    def from_env(cls):
+        """Builds a scheduler from INFERENCE_* environment variables (milliseconds)."""
+        def ms(name, default):
+            return float(os.getenv(name, default)) / 1000.0
+
+        return cls(
+            active_interval=ms("INFERENCE_ACTIVE_INTERVAL_MS", 100),
+            idle_interval=ms("INFERENCE_IDLE_INTERVAL_MS", 500),
+            min_interval=ms("INFERENCE_MIN_INTERVAL_MS", 50),
+            max_interval=ms("INFERENCE_MAX_INTERVAL_MS", 2000),
+            latency_budget=ms("INFERENCE_LATENCY_BUDGET_MS", 250),
+            max_duty=float(os.getenv("INFERENCE_MAX_DUTY", 0.6)),
+            cpu_headroom=float(os.getenv("INFERENCE_CPU_HEADROOM", 0.2)),
+        )
+
+    def due(self, now=None):
+        """Returns True when a recognition pass should run now."""
+        now = time.monotonic() if now is None else now
+        return now >= self.next_run
+
+    def record(self, latency, active, now=None):
+        """Feeds back the duration of a pass and whether a face is being verified."""
+        now = time.monotonic() if now is None else now
+        self.runs += 1
+        if self.runs == 1:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+        if active:
+            self.last_active = now
+            interval = self.active_interval
+        elif self.last_active is not None and now - self.last_active < self.idle_after:
+            # recently saw someone: stay responsive before backing off
+            interval = self.active_interval
+        else:
+            # back off gradually so a person walking up is still picked up quickly
+            interval = min(self.interval * 1.5, self.idle_interval)
+            interval = max(interval, self.active_interval)
+
+        # leave the recognition thread idle at least 1 - max_duty of the time
+        interval = max(interval, self.latency / self.max_duty)
+        if self.latency > self.latency_budget:
+            interval *= self.latency / self.latency_budget
+
+        load = self._cpu_load()
+        if load is not None and load > 1.0 - self.cpu_headroom:
+            interval *= load / (1.0 - self.cpu_headroom)
+
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        self.next_run = now + self.interval
+        logger.debug(
+            "Inference latency %.0f ms, next pass in %.0f ms (load=%s)",
+            self.latency * 1000, self.interval * 1000, load
+        )
+
+    @staticmethod
+    def _cpu_load():
+        """1-minute load average per core, or None where it is unavailable."""
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            return None
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "latency_ms": self.latency * 1000,
+            "interval_ms": self.interval * 1000,
+        }
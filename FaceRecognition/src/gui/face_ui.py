@@ -1,15 +1,22 @@
 import os
+import time
 import threading
 import logging
 import cv2
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout
 from PyQt5.QtGui import QImage, QPixmap, QFont, QGuiApplication, QPalette, QBrush
-from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtCore import QTimer, Qt, QThread, pyqtSignal
 from dotenv import load_dotenv
-from mysql.connector import connect
-from utils import speak_message
+from utils import (
+    speak_message, prerender_announcements, startup_timer,
+    WELCOME_MESSAGE, USER_NOT_FOUND_MESSAGE, FAKE_FACE_MESSAGE
+)
+from core.scheduler import InferenceScheduler
+from core.attendance import (
+    PunchGate, MySQLAttendanceStore, save_punch_photo, UNKNOWN, FAKE_FACE_LOCKOUT, PUNCH
+)
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +25,72 @@ logger = logging.getLogger(__name__)
 # Ensure Qt plugin path is set
 os.environ["QT_QPA_PLATFORM_PLUGIN_PATH"] = "/usr/lib/qt/plugins"
 
+# Seconds between attempts to reload the face models after a failed warm-up
+WARM_UP_RETRY_SECONDS = 30
+
+
+class RecognitionWorker(QThread):
+    """Runs recognition, liveness and punches off the GUI thread.
+
+    Passes are paced by an InferenceScheduler. After each pass the recognized
+    names, the resulting ``(event, name, user_id, punch_type)`` tuples and the
+    time of the pass are sent to the UI through the `recognized` signal.
+    """
+
+    recognized = pyqtSignal(list, list, object)
+
+    def __init__(self, frames, punch_gate, attendance_store, upload_path, parent=None):
+        super().__init__(parent)
+        self.frames = frames
+        self.punch_gate = punch_gate
+        self.attendance_store = attendance_store
+        self.upload_path = upload_path
+        self.scheduler = InferenceScheduler.from_env()
+        self._running = True
+
+    def stop(self):
+        self._running = False
+        self.wait(5000)
+
+    def run(self):
+        from core import fr
+
+        while self._running:
+            if not fr.is_ready() or not self.scheduler.due():
+                self.msleep(10)
+                continue
+            # the capture threads replace these arrays, they are never written in place
+            frame = self.frames['frame']
+            therm = self.frames['thermal_frame']
+            if frame.sum() == 0 or therm.sum() == 0:
+                self.msleep(50)
+                continue
+
+            try:
+                started = time.monotonic()
+                names = fr.recognize_faces(frame, therm)
+                now = datetime.now()
+                events = []
+                for event, name, uid in self.punch_gate.process(names, frame, now, fr.detect_blink):
+                    punch_type = None
+                    if event == PUNCH:
+                        punch_type = self.attendance_store.get_punch_type(uid)
+                        photo_url = save_punch_photo(frame, name, uid, self.upload_path)
+                        self.attendance_store.record_punch(uid, punch_type, photo_url, now)
+                    events.append((event, name, uid, punch_type))
+                # the whole pass counts: recognition, blink check, photo and database
+                self.scheduler.record(
+                    time.monotonic() - started,
+                    active=bool(names) or self.punch_gate.fake_face_counter > 0
+                )
+            except Exception as e:
+                logger.exception("Recognition pass failed: %s", e)
+                self.msleep(1000)
+                continue
+
+            self.recognized.emit(names, events, now)
+
+
 class FaceRecognitionUI(QWidget):
     def __init__(self, verbose=False):
         super().__init__()
@@ -27,12 +100,11 @@ class FaceRecognitionUI(QWidget):
         self.nfs_upload_path = "/mnt/nfs_uploads"
         os.makedirs(self.nfs_upload_path, exist_ok=True)
 
-        # Liveness & duplicate punch control
-        self.last_punches = {}
-        self.fake_face_counter = 0
-        self.fake_face_timeout = None
-                # Unknown user notification throttle
-        self.unknown_timeout = None
+        # Liveness, duplicate punch control and unknown user throttle
+        self.punch_gate = PunchGate()
+        self.attendance_store = MySQLAttendanceStore()
+        self.announcements_prerendered = False
+        self.warm_up_retry_at = None
 
         # Instruction cycle
         self.instructions = ["Hold still for a moment", "Ensure your face is well-lit"]
@@ -69,11 +141,18 @@ class FaceRecognitionUI(QWidget):
             'thermal_frame': np.zeros((feed_h, half_w, 3), dtype=np.uint8)
         }
         self.shared_frames = self.frames
+        self.camera_manager = None
 
-        # Timers
+        # The display refreshes at a fixed rate on the GUI thread; recognition
+        # runs in its own thread, paced by its scheduler
+        self.recognition_worker = RecognitionWorker(
+            self.frames, self.punch_gate, self.attendance_store, self.nfs_upload_path
+        )
+        self.recognition_worker.recognized.connect(self.handle_recognition)
+        self.recognition_worker.start()
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
-        self.timer.start(100)
+        self.timer.start(int(os.getenv("DISPLAY_INTERVAL_MS", "40")))
 
         # Start folder watcher
         self.start_folder_watcher()
@@ -132,22 +211,16 @@ class FaceRecognitionUI(QWidget):
         self.status_label.setText(self.instructions[self.current_instruction])
 
     def start_camera_capture(self):
-        from core.camera import capture_frames
+        from core.camera import CameraStreamManager, nvr_rtsp_url
         from core import fr
-        fr.load_known_faces()
+        # no-op if run_gui already started the warm-up
+        fr.warm_up()
         load_dotenv()
-        user, pwd, ip, port = (
-            os.getenv('CAMERA_USER'),
-            os.getenv('CAMERA_PASSWORD'),
-            os.getenv('CAMERA_IP'),
-            os.getenv('CAMERA_PORT')
-        )
-        rtsp1 = f"rtsp://{user}:{pwd}@{ip}:{port}/cam/realmonitor?channel=1&subtype=0"
-        rtsp2 = f"rtsp://{user}:{pwd}@{ip}:{port}/cam/realmonitor?channel=2&subtype=0"
-        threading.Thread(
-            target=lambda: capture_frames(rtsp1, rtsp2, shared_dict=self.shared_frames),
-            daemon=True
-        ).start()
+        rtsp1 = nvr_rtsp_url(1)
+        rtsp2 = nvr_rtsp_url(2)
+        # streams connect and reconnect in their own threads, this does not block
+        self.camera_manager = CameraStreamManager(rtsp1, rtsp2, shared_dict=self.shared_frames)
+        startup_timer.mark("camera capture started")
 
     def start_folder_watcher(self):
         try:
@@ -156,60 +229,63 @@ class FaceRecognitionUI(QWidget):
         except:
             pass
 
-    @staticmethod
-    def extract_user_id(name):
-        try:
-            return int(name.split(" - ")[0])
-        except:
+    def describe_camera_health(self):
+        """Short status line for streams that are not live."""
+        if self.camera_manager is None:
+            return "Camera: Waiting for feed..."
+        parts = []
+        for cam_type, health in self.camera_manager.health().items():
+            if health["state"] == "live":
+                continue
+            text = f"{cam_type} {health['state']}"
+            if health["retry_in"] is not None:
+                text += f", retry in {health['retry_in']:.0f}s"
+            parts.append(text)
+        return f"Camera: {'; '.join(parts)}" if parts else "Camera: Waiting for feed..."
+
+    def check_warm_up(self):
+        """Retries a failed model warm-up; returns the failure to show, or None."""
+        from core import fr
+        if fr.is_ready() or fr.warm_up_error is None:
             return None
-
-    def get_punch_type(self, user_id):
-        conn = connect(
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            host=os.getenv('DB_HOST'),
-            database=os.getenv('DB_NAME')
-        )
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT punch_type FROM log_Information WHERE user_id=%s ORDER BY date_time_event DESC LIMIT 1",
-            (user_id,)
-        )
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return 'OUT' if row and row[0] == 'IN' else 'IN'
-
-    def capture_punch_photo(self, frame, name, user_id):
-        ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-        fn = name.replace(' ', '_')
-        path = os.path.join(self.nfs_upload_path, f"{fn}_{user_id}_{ts}.jpg")
-        cv2.imwrite(path, frame)
-        return f"/uploads/{os.path.basename(path)}"
+        now = time.monotonic()
+        if self.warm_up_retry_at is None:
+            self.warm_up_retry_at = now + WARM_UP_RETRY_SECONDS
+        elif now >= self.warm_up_retry_at:
+            self.warm_up_retry_at = None
+            fr.warm_up()
+            return None
+        return f"❌ Face recognition failed to start, retrying: {fr.warm_up_error}"
 
     def update_frame(self):
+        from core import fr
+        warm_up_failure = self.check_warm_up()
+
         frame = self.frames['frame']
         therm = self.frames['thermal_frame']
         if frame.sum() == 0 or therm.sum() == 0:
-            self.camera_status.setText("Camera: Waiting for feed...")
+            self.camera_status.setText(self.describe_camera_health())
             self.instruction_timer.stop()
-            self.status_label.setText("Please look at the camera")
+            self.status_label.setText(warm_up_failure or "Please look at the camera")
             return
 
         self.camera_status.setText("✅ Cameras active")
         self.image_label.setPixmap(self.convert_cv_qt(frame, self.image_label.size()))
         self.thermal_label.setPixmap(self.convert_cv_qt(therm, self.thermal_label.size()))
+        startup_timer.mark("first frame displayed")
 
-        from core import fr
-        names = fr.recognize_faces(frame, therm)
-        now = datetime.now()
-
-        for name in names:
-            if name == "Unknown":
-                # throttle notifications to once per 5s
-                if self.unknown_timeout and now < self.unknown_timeout:
-                    continue
-                self.unknown_timeout = now + timedelta(seconds=5)
+        if not fr.is_ready():
+            self.status_label.setText(warm_up_failure or "Loading face models, please wait...")
+            return
+        if not self.announcements_prerendered:
+            self.announcements_prerendered = True
+            names = list(fr.known_face_names)
+            threading.Thread(target=prerender_announcements, args=(names,), daemon=True).start()
+
+    def handle_recognition(self, names, events, now):
+        """Shows the outcome of one recognition pass (runs on the GUI thread)."""
+        for event, name, uid, punch_type in events:
+            if event == UNKNOWN:
                 # delayed popup and TTS
                 def notify_unknown():
                     self.instruction_timer.stop()
@@ -217,7 +293,7 @@ class FaceRecognitionUI(QWidget):
                         "background-color: #F44336; color: white; padding: 10px; border-radius: 5px;"
                     )
                     self.status_label.setText("❌ User not found, please contact HR department")
-                    speak_message("User not found, please contact HR department")
+                    speak_message(USER_NOT_FOUND_MESSAGE)
                     # revert after 3s
                     QTimer.singleShot(3000, lambda: (
                         self.status_label.setStyleSheet("background: transparent; color: black;"),
@@ -225,38 +301,10 @@ class FaceRecognitionUI(QWidget):
                         self.instruction_timer.start(3000)
                     ))
                 QTimer.singleShot(500, notify_unknown)
-                continue
-            if name == "Fake Face":
-                continue
-
-            # fake-face lockout
-            if self.fake_face_timeout and now < self.fake_face_timeout:
-                continue
-
-            uid = self.extract_user_id(name)
-            if uid is None:
-                continue
-
-            # liveness blink detection
-            if not fr.detect_blink(frame):
-                self.fake_face_counter += 1
-                if self.fake_face_counter >= 10:
-                    speak_message("Fake Face Detected, please try again in 30 seconds")
-                    self.fake_face_timeout = now + timedelta(seconds=30)
-                    self.fake_face_counter = 0
-                continue
-
-            self.fake_face_counter = 0
-
-            # duplicate punch suppression
-            last = self.last_punches.get(uid)
-            if last and (now - last).total_seconds() < 30:
-                continue
-
-            self.last_punches[uid] = now
-            punch_type = self.get_punch_type(uid)
-            photo_url = self.capture_punch_photo(frame, name, uid)
-            self.record_attendance(name, uid, punch_type, photo_url, now)
+            elif event == FAKE_FACE_LOCKOUT:
+                speak_message(FAKE_FACE_MESSAGE)
+            else:
+                self.show_punch(name, punch_type, now)
 
         # restart instructions or default text
         if names and not self.instruction_timer.isActive():
@@ -267,37 +315,10 @@ class FaceRecognitionUI(QWidget):
             self.status_label.setStyleSheet("background: transparent; color: black;")
             self.status_label.setText("Please look at the camera")
 
-    
-    def record_attendance(self, name, user_id, punch_type, photo_url, now):
-        """Insert a punch record into log_Information and show confirmation."""
+    def show_punch(self, name, punch_type, now):
+        """Shows and announces a punch recorded by the recognition worker."""
         self.instruction_timer.stop()
 
-        device_id = 1
-        longitude = float(os.getenv('LONGITUDE', '14.47631000'))
-        latitude  = float(os.getenv('LATITUDE',  '35.92584060'))
-
-        conn = connect(
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            host=os.getenv('DB_HOST'),
-            database=os.getenv('DB_NAME')
-        )
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO log_Information "
-            "(date_time_saved, date_time_event, device_id, user_id, punch_type, photo_url, "
-            "longitude, latitude, punch_date, punch_time) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-            (
-                now, now, device_id, user_id, punch_type,
-                photo_url, longitude, latitude,
-                now.date(), now.time()
-            )
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-
         # display only first name
         first_name = name.split(" - ")[-1].split()[0]
         time_str = now.strftime('%H:%M:%S')
@@ -309,7 +330,7 @@ class FaceRecognitionUI(QWidget):
         self.status_label.setText(f"👋 {first_name} punched {punch_type} at {time_str}")
 
         # TTS
-        speak_message(f"Welcome {first_name}, punch {punch_type}")
+        speak_message(WELCOME_MESSAGE.format(first_name=first_name, punch_type=punch_type))
 
         # revert after 3s
         QTimer.singleShot(
@@ -329,5 +350,6 @@ class FaceRecognitionUI(QWidget):
         return pix.scaled(target_size, Qt.KeepAspectRatio)
 
     def closeEvent(self, event):
+        self.recognition_worker.stop()
         event.accept()
 
@@ -1,3 +1,6 @@
 # Utils module initializer
-from .utils import speak_message
-
+from .utils import (
+    speak_message, prerender_announcements,
+    WELCOME_MESSAGE, USER_NOT_FOUND_MESSAGE, FAKE_FACE_MESSAGE
+)
+from .startup import startup_timer
@@ -0,0 +1,41 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Records how long each startup phase took since the process started."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        """Records a phase the first time it is reached; later calls are ignored."""
+        with self._lock:
+            if phase in self._seen:
+                return
+            self._seen.add(phase)
+            elapsed = time.perf_counter() - self.start
+            self.phases.append((phase, elapsed))
+        logger.debug("Startup: %s after %.0f ms", phase, elapsed * 1000)
+
+    def report(self):
+        """Logs every phase reached so far with its offset and duration."""
+        with self._lock:
+            phases = list(self.phases)
+        lines = []
+        previous = 0.0
+        for phase, elapsed in phases:
+            lines.append(f"  {elapsed * 1000:8.0f} ms (+{(elapsed - previous) * 1000:6.0f}) {phase}")
+            previous = elapsed
+        logger.info("Startup timing:\n%s", "\n".join(lines))
+        return phases
+
+
+# Shared timer; created when this module is first imported
+startup_timer = StartupTimer()
@@ -1,23 +1,174 @@
-from gtts import gTTS
-import threading
 import os
+import time
+import hashlib
+import threading
 import subprocess
+from collections import deque
+
+# Announcement phrases, shared by the UI and the pre-rendering step
+WELCOME_MESSAGE = "Welcome {first_name}, punch {punch_type}"
+USER_NOT_FOUND_MESSAGE = "User not found, please contact HR department"
+FAKE_FACE_MESSAGE = "Fake Face Detected, please try again in 30 seconds"
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.expanduser("~/.cache/garrison_tts"))
+
+
+class GTTSBackend:
+    """Google Text-to-Speech (needs network on a cache miss)."""
+    name = "gtts"
+    extension = ".mp3"
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+
+    def synthesize(self, text, path):
+        from gtts import gTTS
+        gTTS(text=text, lang=self.lang).save(path)
+
+
+class EspeakBackend:
+    """Local, offline synthesis through espeak-ng (or espeak)."""
+    name = "espeak"
+    extension = ".wav"
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+
+    def synthesize(self, text, path):
+        for binary in ("espeak-ng", "espeak"):
+            try:
+                subprocess.run([binary, "-v", self.lang, "-w", path, text], check=True)
+                return
+            except FileNotFoundError:
+                continue
+        raise RuntimeError("espeak-ng/espeak is not installed")
+
+
+# Available backends; register more with TTS_BACKENDS[name] = cls
+TTS_BACKENDS = {
+    GTTSBackend.name: GTTSBackend,
+    EspeakBackend.name: EspeakBackend,
+}
+
+# Command used to play each audio format
+AUDIO_PLAYERS = {
+    ".mp3": ["mpg123", "-q"],
+    ".wav": ["aplay", "-q"],
+}
+
+
+def get_backend(name=None, lang='en'):
+    """Returns the TTS backend named by `name` or the TTS_BACKEND env var.
+
+    An unknown TTS_BACKEND falls back to gTTS so a misconfigured kiosk keeps
+    talking; an unknown explicit `name` raises ValueError.
+    """
+    if name is None:
+        name = os.getenv("TTS_BACKEND", GTTSBackend.name)
+        if name not in TTS_BACKENDS:
+            print(f"⚠️ Unknown TTS_BACKEND '{name}', falling back to {GTTSBackend.name}.")
+            name = GTTSBackend.name
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend: {name}")
+    return TTS_BACKENDS[name](lang=lang)
 
-def _play_audio(message):
-    """Plays text-to-speech message using gTTS and mpg123 (non-blocking)."""
-    try:
-        filename = "welcome.mp3"
-        tts = gTTS(text=message, lang='en')
-        tts.save(filename)
 
-        # Use system audio player
-        subprocess.call(["mpg123", filename])
+def cached_audio(text, backend, cache_dir=TTS_CACHE_DIR):
+    """Returns the path of the synthesized `text`, rendering it on a cache miss."""
+    key = hashlib.sha1(f"{backend.name}|{backend.lang}|{text}".encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, key + backend.extension)
+    if os.path.exists(path):
+        return path
 
-        os.remove(filename)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp{backend.extension}"
+    backend.synthesize(text, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+class AudioWorker:
+    """Plays announcements one at a time from a bounded queue.
+
+    A message that is already waiting, or was just played, is not queued
+    again. When the queue is full the oldest message is dropped so the
+    latest announcement is never the one lost.
+    """
+
+    def __init__(self, backend=None, max_pending=4, repeat_window=3.0):
+        self.backend = backend or get_backend()
+        self.repeat_window = repeat_window
+        self._pending = deque(maxlen=max_pending)
+        self._last_played = {}
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="audio-worker", daemon=True)
+        self._thread.start()
+
+    def say(self, message):
+        with self._cond:
+            if message in self._pending:
+                return
+            played = self._last_played.get(message)
+            if played is not None and time.monotonic() - played < self.repeat_window:
+                return
+            self._pending.append(message)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                message = self._pending.popleft()
+            self._play(message)
+            with self._cond:
+                self._last_played[message] = time.monotonic()
+
+    def _play(self, message):
+        try:
+            path = cached_audio(message, self.backend)
+            subprocess.call(AUDIO_PLAYERS[self.backend.extension] + [path])
+        except Exception as e:
+            print(f"❌ TTS Error: {e}")
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _get_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = AudioWorker()
+        return _worker
+
+
+def speak_message(message):
+    """Queue the message on the audio worker (non-blocking, never raises)."""
+    try:
+        _get_worker().say(message)
     except Exception as e:
         print(f"❌ TTS Error: {e}")
 
-def speak_message(message):
-    """Speak the message in a background thread (non-blocking)."""
-    threading.Thread(target=_play_audio, args=(message,), daemon=True).start()
 
+def prerender_announcements(names, backend=None):
+    """Synthesizes every announcement for the given display names into the cache.
+
+    Names look like ``"<id> - First Last"``; returns the number of phrases rendered.
+    """
+    backend = backend or get_backend()
+    messages = {USER_NOT_FOUND_MESSAGE, FAKE_FACE_MESSAGE}
+    for name in names:
+        first_name = name.split(" - ")[-1].split()[0]
+        for punch_type in ("IN", "OUT"):
+            messages.add(WELCOME_MESSAGE.format(first_name=first_name, punch_type=punch_type))
+
+    rendered = 0
+    for message in sorted(messages):
+        try:
+            cached_audio(message, backend)
+            rendered += 1
+        except Exception as e:
+            print(f"❌ TTS Error while pre-rendering '{message}': {e}")
+    return rendered